@@ -0,0 +1,12 @@
+import hmac
+import os
+from flask import jsonify, request
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def is_admin():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+def forbidden():
+    return jsonify({"error": "Forbidden"}), 403
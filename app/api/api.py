@@ -1,32 +1,43 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify
 from flask_cors import CORS
-import requests
+import logging
 import os
+import signal
+import numpy as np
 from dotenv import load_dotenv
-from recommend import recommend_exercises, get_popular_exercises
-from full_recommendation import generate_full_workout_plan
 
 load_dotenv()
-app = Flask(__name__)
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    },
-    r"/*": {
-        "origins": ["http://localhost:3000"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
+import metrics
+import profiling
+from admin import forbidden, is_admin
+from nutrition import NUTRITION_SOURCE, get_fdc_id, get_nutrition_by_fdc, get_nutrition_batch
+from recommend import recommend_exercises, recommend_exercises_batch, resolve_exercise_row, search_exercises, get_popular_exercises
+from full_recommendation import generate_full_workout_plan, generate_workout_plans
+from catalog_state import current_snapshot, reload_catalog, watch_catalog, CATALOG_WATCH_INTERVAL
+from catalog import rows_for_name
+from http_cache import cached_response
+import warmup
+
+logger = logging.getLogger(__name__)
+
+routes = Blueprint("routes", __name__)
 
 USDA_API_KEY = os.getenv("USDA_API_KEY")
 USDA_BASE_URL = os.getenv("USDA_BASE_URL")
 
-if not USDA_API_KEY or not USDA_BASE_URL:
+if NUTRITION_SOURCE != "local" and (not USDA_API_KEY or not USDA_BASE_URL):
     raise ValueError("Missing USDA_API_KEY or USDA_BASE_URL in .env file")
 
+NUTRITION_BATCH_LIMIT = int(os.getenv("NUTRITION_BATCH_LIMIT", 50))
+RECOMMEND_BATCH_LIMIT = int(os.getenv("RECOMMEND_BATCH_LIMIT", 100))
+PLAN_BATCH_LIMIT = int(os.getenv("PLAN_BATCH_LIMIT", 500))
+PLAN_MAX_WEEKS = int(os.getenv("PLAN_MAX_WEEKS", 12))
+
 SPLIT_TYPES = {
     "total_body": ["Chest", "Back", "Legs", "Shoulders", "Arms", "Core"],
     "upper_lower": {
@@ -48,107 +59,110 @@ SPLIT_TYPES = {
     }
 }
 
-NUTRIENT_IDS = {
-    "Total Fat": 1004,
-    "Saturated Fat": 1258,
-    "Trans Fat": 1257,
-    "Cholesterol": 1253,
-    "Sodium": 1093,
-    "Total Carbohydrates": 1005,
-    "Dietary Fiber": 1079,
-    "Total Sugars": 2000,
-    "Added Sugars": 1235,
-    "Protein": 1003,
-    "Energy": [1008, 2048, 2047]
-}
-
-def get_fdc_id(food_query):
-    url = f"{USDA_BASE_URL}/foods/search?api_key={USDA_API_KEY}"
-    payload = {
-        "query": food_query,
-        "dataType": ["Foundation", "SR Legacy"],
-        "pageSize": 5,
-        "sortBy": "dataType.keyword",
-        "sortOrder": "asc"
-    }
-    headers = {"Content-Type": "application/json"}
-
-    response = requests.post(url, json=payload, headers=headers)
-
-    if response.status_code == 200:
-        data = response.json()
-        if "foods" in data and data["foods"]:
-            for food in data["foods"]:
-                description = food.get("description", "").lower()
-                if description == food_query.lower():
-                    return food.get("fdcId")
-
-            for food in data["foods"]:
-                if food.get("dataType") == "Foundation":
-                    return food.get("fdcId")
-
-            return data["foods"][0].get("fdcId")
-
-    return None
-
-def get_nutrition_by_fdc(fdc_id):
-    url = f"{USDA_BASE_URL}/foods?fdcIds={fdc_id}&format=full&api_key={USDA_API_KEY}"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        data = response.json()
-        if isinstance(data, list) and len(data) > 0:
-            food_item = data[0]
-            nutrients = food_item.get("foodNutrients", [])
-
-            macronutrients = {}
-            for nutrient in nutrients:
-                nutrient_id = nutrient.get("nutrient", {}).get("id")
-                amount = nutrient.get("amount", 0)
-                unit = nutrient.get("nutrient", {}).get("unitName", "")
-
-                for name, nid in NUTRIENT_IDS.items():
-                    if isinstance(nid, list):
-                        if nutrient_id in nid:
-                            if name == "Energy" and nutrient_id == 1008:
-                                macronutrients[name] = f"{amount} {unit}"
-                            elif name == "Energy" and name not in macronutrients:
-                                macronutrients[name] = f"{amount} {unit}"
-                    elif nutrient_id == nid:
-                        macronutrients[name] = f"{amount} {unit}"
-
-            return {
-                "Food": food_item.get("description", "Unknown"),
-                "Nutrients": macronutrients
-            }
-
-    return None
-
-@app.route('/recommend', methods=['GET'])
-def recommend():
+@routes.route('/recommend', methods=['GET'])
+@cached_response()
+def recommend(snapshot):
     exercise = request.args.get('exercise', '').lower().strip()
+    exercise_id = request.args.get('id', '').strip()
     top_n = int(request.args.get('top_n', 5))
 
-    if not exercise:
+    if not exercise and not exercise_id:
         return jsonify({"error": "Missing exercise parameter"}), 400
+    if exercise_id and not exercise_id.lstrip('-').isdigit():
+        return jsonify({"error": "id must be an integer"}), 400
+    exercise_id = int(exercise_id) if exercise_id else None
+
+    filters = {
+        "equipment": parse_list(request.args.get('equipment', '')),
+        "exercise_type": parse_list(request.args.get('exercise_type', '')),
+        "level": parse_list(request.args.get('level', '')),
+        "muscle": parse_list(request.args.get('muscle', ''))
+    }
 
-    recommendations = recommend_exercises(exercise, top_n)
-    
-    return jsonify({"exercise": exercise, "recommended": recommendations})
-
-@app.route('/popular', methods=['GET'])
-def popular():
+    catalog = snapshot["catalog"]
+    row = resolve_exercise_row(exercise, exercise_id, snapshot)
+    matched, matched_id, matched_ids = None, None, []
+    recommendations, recommendation_ids = [], []
+    if row is not None:
+        matched = catalog["names"][row]
+        matched_id = int(catalog["exercise_ids"][row])
+        matched_ids = catalog["exercise_ids"][rows_for_name(catalog, matched)].tolist()
+        recommendations, recommendation_ids = recommend_exercises(
+            matched, top_n, filters["equipment"], filters["exercise_type"], filters["level"], filters["muscle"],
+            exercise_id=matched_id, with_ids=True, snapshot=snapshot
+        )
+
+    response = {
+        "exercise": exercise,
+        "matched_exercise": matched,
+        "matched_id": matched_id,
+        "matched_ids": matched_ids,
+        "recommended": recommendations,
+        "recommended_ids": recommendation_ids
+    }
+    if any(filters.values()):
+        response["filters"] = filters
+    return jsonify(response)
+
+@routes.route('/search', methods=['GET'])
+@cached_response()
+def search_route(snapshot):
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', '10').strip()
+    mode = request.args.get('mode', 'all').lower().strip()
+
+    if not query:
+        return jsonify({"error": "Missing q parameter"}), 400
+    if not limit.isdigit():
+        return jsonify({"error": "limit must be a non-negative integer"}), 400
+    limit = min(int(limit), 50)
+    if mode not in ("all", "prefix", "fuzzy"):
+        return jsonify({"error": "Invalid mode. Choose from all, prefix, fuzzy"}), 400
+
+    return jsonify({"query": query, "results": search_exercises(query, limit, mode, snapshot)})
+
+@routes.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    data = request.get_json(silent=True) or {}
+    exercises = data.get("exercises")
+    top_n = data.get("top_n", 5)
+    exclude_submitted = data.get("exclude_submitted", True)
+    filters = {key: parse_list(data.get(key)) for key in ("equipment", "exercise_type", "level", "muscle")}
+
+    if not isinstance(exercises, list) or not exercises:
+        return jsonify({"error": "Provide a non-empty 'exercises' list"}), 400
+    if len(exercises) > RECOMMEND_BATCH_LIMIT:
+        return jsonify({"error": f"At most {RECOMMEND_BATCH_LIMIT} exercises per request"}), 400
+    if isinstance(top_n, bool) or not isinstance(top_n, int) or top_n < 0:
+        return jsonify({"error": "top_n must be a non-negative integer"}), 400
+    if not isinstance(exclude_submitted, bool):
+        return jsonify({"error": "exclude_submitted must be a boolean"}), 400
+    if not all(isinstance(exercise, str) for exercise in exercises):
+        return jsonify({"error": "Exercises must be strings"}), 400
+
+    recommendations, not_found = recommend_exercises_batch(
+        exercises, top_n, exclude_submitted,
+        filters["equipment"], filters["exercise_type"], filters["level"], filters["muscle"]
+    )
+
+    return jsonify({"recommended": recommendations, "not_found": not_found})
+
+@routes.route('/popular', methods=['GET'])
+@cached_response()
+def popular(snapshot):
     muscle = request.args.get('muscle', '').lower().strip()
     top_n = int(request.args.get('top_n', 5))
+    equipment = request.args.get('equipment')
+    level = request.args.get('level')
 
     if not muscle:
         return jsonify({"error": "Missing muscle group parameter"}), 400
 
-    popular_exercises = get_popular_exercises(muscle, top_n)
+    popular_exercises, popular_ids = get_popular_exercises(muscle, top_n, equipment, level, with_ids=True, snapshot=snapshot)
     
-    return jsonify({"muscle_group": muscle, "popular_exercises": popular_exercises})
+    return jsonify({"muscle_group": muscle, "popular_exercises": popular_exercises, "popular_exercise_ids": popular_ids})
 
-@app.route('/full_recommendation', methods=['GET'])
+@routes.route('/full_recommendation', methods=['GET'])
 def full_recommendation():
     split_type = request.args.get('split_type', '').lower().strip()
     
@@ -157,16 +171,73 @@ def full_recommendation():
     equipment_list = [e.strip() for e in equipment_str.split(',')] if equipment_str else []
     exercise_type_list = [t.strip() for t in exercise_type_str.split(',')] if exercise_type_str else []
     
-    print(f"Equipment list: {equipment_list}")
-    print(f"Exercise type list: {exercise_type_list}")
+    logger.debug("Equipment list: %s, exercise type list: %s", equipment_list, exercise_type_list)
 
     if split_type not in SPLIT_TYPES:
         return jsonify({"error": "Invalid split type. Choose from total_body, upper_lower, push_pull_legs, bro_split"}), 400
 
-    plan = generate_full_workout_plan(split_type, equipment_list, exercise_type_list)
-    return jsonify({"split_type": split_type, "workout_plan": plan})
+    seed = request.args.get('seed', '').strip()
+    if seed and not seed.isdigit():
+        return jsonify({"error": "seed must be a non-negative integer"}), 400
+    rng = np.random.default_rng(int(seed)) if seed else None
+
+    plan, plan_ids = generate_full_workout_plan(split_type, equipment_list, exercise_type_list, rng, with_ids=True)
+    return jsonify({"split_type": split_type, "workout_plan": plan, "workout_plan_ids": plan_ids})
 
-@app.route('/get_nutrition', methods=['GET'])
+def parse_list(value):
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return []
+
+def parse_plan_spec(spec):
+    if not isinstance(spec, dict):
+        return None, "Each plan must be an object"
+
+    split_type = str(spec.get("split_type", "")).lower().strip()
+    if split_type not in SPLIT_TYPES:
+        return None, "Invalid split type. Choose from total_body, upper_lower, push_pull_legs, bro_split"
+
+    seed = spec.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        return None, "seed must be a non-negative integer"
+
+    weeks = spec.get("weeks", 1)
+    if isinstance(weeks, bool) or not isinstance(weeks, int) or not 1 <= weeks <= PLAN_MAX_WEEKS:
+        return None, f"weeks must be an integer between 1 and {PLAN_MAX_WEEKS}"
+
+    return {
+        "split_type": split_type,
+        "equipment": parse_list(spec.get("equipment")),
+        "exercise_type": parse_list(spec.get("exercise_type")),
+        "seed": seed,
+        "weeks": weeks
+    }, None
+
+@routes.route('/full_recommendation/batch', methods=['POST'])
+def full_recommendation_batch():
+    data = request.get_json(silent=True) or {}
+    plans = data.get("plans")
+    no_repeat = data.get("no_repeat", False)
+
+    if not isinstance(plans, list) or not plans:
+        return jsonify({"error": "Provide a non-empty 'plans' list"}), 400
+    if len(plans) > PLAN_BATCH_LIMIT:
+        return jsonify({"error": f"At most {PLAN_BATCH_LIMIT} plans per request"}), 400
+    if not isinstance(no_repeat, bool):
+        return jsonify({"error": "no_repeat must be a boolean"}), 400
+
+    specs = []
+    for i, plan in enumerate(plans):
+        spec, error = parse_plan_spec(plan)
+        if error:
+            return jsonify({"error": f"plans[{i}]: {error}"}), 400
+        specs.append(spec)
+
+    return jsonify({"no_repeat": no_repeat, "plans": generate_workout_plans(specs, no_repeat)})
+
+@routes.route('/get_nutrition', methods=['GET'])
 def get_nutrition():
     food_query = request.args.get("food", "").strip()
 
@@ -183,7 +254,59 @@ def get_nutrition():
 
     return jsonify(nutrition_data)
 
-@app.route('/api/saved-workouts', methods=['POST'])
+@routes.route('/get_nutrition/batch', methods=['POST'])
+def get_nutrition_batch_route():
+    data = request.get_json(silent=True) or {}
+    foods = data.get("foods")
+
+    if not isinstance(foods, list) or not foods:
+        return jsonify({"error": "Provide a non-empty 'foods' list"}), 400
+    if len(foods) > NUTRITION_BATCH_LIMIT:
+        return jsonify({"error": f"At most {NUTRITION_BATCH_LIMIT} foods per request"}), 400
+
+    if not all(isinstance(food, str) and food.strip() for food in foods):
+        return jsonify({"error": "Food queries must be non-empty strings"}), 400
+    food_queries = [food.strip() for food in foods]
+
+    return jsonify(get_nutrition_batch(food_queries))
+
+@routes.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    if not is_admin():
+        return forbidden()
+
+    force = request.args.get("force", "").lower() in ("1", "true", "yes")
+    master_pid = current_app.config.get("SERVE_MASTER_PID")
+    if master_pid:
+        # Under serve.py the master reloads once and re-forks every worker; reloading here would only update this one.
+        os.kill(master_pid, signal.SIGUSR1 if force else signal.SIGHUP)
+        snapshot = current_snapshot()
+        return jsonify({"reloaded": None, "scheduled": True, "version": snapshot["version"] if snapshot else None}), 202
+
+    snapshot, reloaded = reload_catalog(force)
+
+    return jsonify({
+        "reloaded": reloaded,
+        "version": snapshot["version"],
+        "exercises": snapshot["catalog"]["size"],
+        "stats": snapshot["stats"],
+        "ingest": snapshot["ingest"]
+    })
+
+@routes.route('/health', methods=['GET'])
+def health():
+    return jsonify(warmup.health())
+
+@routes.route('/ready', methods=['GET'])
+def ready():
+    if warmup.is_ready():
+        return jsonify({"ready": True, "subsystems": warmup.subsystem_states()})
+
+    # Cold or failed subsystems are (re)started here so a probe alone is enough to bring the service up.
+    warmup.start_warmup()
+    return jsonify({"ready": False, "subsystems": warmup.subsystem_states()}), 503
+
+@routes.route('/api/saved-workouts', methods=['POST'])
 def save_workout():
     try:
         data = request.get_json()
@@ -210,5 +333,32 @@ def save_workout():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def create_app():
+    app = Flask(__name__)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:3000"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        },
+        r"/*": {
+            "origins": ["http://localhost:3000"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+    app.register_blueprint(routes)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
+    # With debug=True the reloader re-runs this file in a child that does the serving; the parent only watches files.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if warmup.WARMUP_ON_START:
+            warmup.start_warmup()
+        if CATALOG_WATCH_INTERVAL > 0:
+            watch_catalog(CATALOG_WATCH_INTERVAL)
     app.run(debug=True, port=5001)
@@ -0,0 +1,296 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_FORMAT_VERSION = 1
+BENCHMARK_ROWS = [10000, 100000, 1000000]
+BENCHMARK_QUERIES = int(os.getenv("BENCHMARK_QUERIES", 200))
+BENCHMARK_WARMUP = int(os.getenv("BENCHMARK_WARMUP", 5))
+BENCHMARK_TIMEOUT = float(os.getenv("BENCHMARK_TIMEOUT", 3600))
+BENCHMARK_SEED = 490
+SOURCE_COLUMNS = ["Title", "Desc", "Type", "BodyPart", "Equipment", "Level", "Rating", "RatingDesc"]
+SPLIT_TYPES = ["total_body", "upper_lower", "push_pull_legs", "bro_split"]
+PERCENTILES = [50, 90, 95, 99]
+
+def generate_catalog(source_path, rows, output_path, seed=BENCHMARK_SEED):
+    source = pd.read_csv(source_path)
+    rng = np.random.default_rng(seed)
+
+    # Whole source rows are resampled, so the joint Type/BodyPart/Equipment/Level mix and the share of missing ratings carry over.
+    picks = rng.integers(0, len(source), rows)
+    catalog = source[SOURCE_COLUMNS].iloc[picks].reset_index(drop=True)
+    variants = pd.Series(np.arange(rows) // len(source), dtype=str)
+    catalog["Title"] = catalog["Title"].astype(str).where(variants == "0", catalog["Title"].astype(str) + " " + variants)
+    catalog.insert(0, "Unnamed: 0", np.arange(rows))
+
+    catalog.to_csv(output_path, index=False)
+    return output_path
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize(samples):
+    samples = np.asarray(samples) * 1000.0
+    summary = {f"p{p}_ms": round(float(np.percentile(samples, p)), 3) for p in PERCENTILES}
+    summary["mean_ms"] = round(float(samples.mean()), 3)
+    summary["max_ms"] = round(float(samples.max()), 3)
+    summary["count"] = len(samples)
+    return summary
+
+def endpoint_requests(snapshot, queries, rng):
+    from catalog import column_labels
+    catalog = snapshot["catalog"]
+    names = catalog["names"]
+    muscles = column_labels(catalog, "muscle_group")
+    equipment = column_labels(catalog, "Equipment")
+    types = column_labels(catalog, "Type")
+
+    def rows():
+        return rng.integers(0, len(names), queries)
+
+    return {
+        "recommend": [("GET", "/recommend", {"exercise": names[row]}, None) for row in rows()],
+        "search": [("GET", "/search", {"q": names[row][:max(3, len(names[row]) // 2)]}, None) for row in rows()],
+        "recommend_batch": [
+            ("POST", "/recommend/batch", None, {"exercises": names[rng.integers(0, len(names), 10)].tolist()})
+            for _ in range(queries)
+        ],
+        "popular": [
+            ("GET", "/popular", {"muscle": muscles[row], "equipment": equipment[row]}, None) for row in rows()
+        ],
+        "full_recommendation": [
+            ("GET", "/full_recommendation", {
+                "split_type": SPLIT_TYPES[row % len(SPLIT_TYPES)],
+                "equipment": equipment[row],
+                "exercise_type": types[row]
+            }, None)
+            for row in rows()
+        ]
+    }
+
+def time_endpoint(client, requests, warmup=BENCHMARK_WARMUP):
+    samples = []
+    errors = 0
+    for i, (method, path, params, body) in enumerate(requests):
+        start = time.perf_counter()
+        if method == "GET":
+            response = client.get(path, query_string=params)
+        else:
+            response = client.post(path, json=body)
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 500:
+            errors += 1
+        if i >= warmup:
+            samples.append(elapsed)
+
+    summary = summarize(samples) if samples else {"count": 0}
+    summary["errors"] = errors
+    return summary
+
+def run_worker(queries, seed, measure_latency):
+    start = time.perf_counter()
+    import api
+    from catalog_state import get_snapshot
+    snapshot = get_snapshot()
+    result = {
+        "startup_seconds": round(time.perf_counter() - start, 4),
+        "startup_rss_mb": peak_rss_mb(),
+        "rows": snapshot["catalog"]["size"],
+        "model_stats": snapshot["stats"]
+    }
+
+    if measure_latency:
+        rng = np.random.default_rng(seed)
+        client = api.app.test_client()
+        result["endpoints"] = {
+            endpoint: time_endpoint(client, requests)
+            for endpoint, requests in endpoint_requests(snapshot, queries + BENCHMARK_WARMUP, rng).items()
+        }
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def run_phase(dataset_path, cache_dir, queries, seed, measure_latency, timeout):
+    env = dict(os.environ)
+    env.update({
+        "DATASET_PATH": dataset_path,
+        "CATALOG_CACHE_DIR": os.path.join(cache_dir, "catalog"),
+        "MODEL_CACHE_DIR": os.path.join(cache_dir, "models"),
+        "CATALOG_WATCH_INTERVAL": "0",
+        # Repeated queries would otherwise be served from the response cache instead of the routes being measured.
+        "RESPONSE_CACHE_SIZE": "0",
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING")
+    })
+    env.setdefault("USDA_API_KEY", "benchmark")
+    env.setdefault("USDA_BASE_URL", "http://127.0.0.1:9")
+
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--queries", str(queries), "--seed", str(seed)]
+    if not measure_latency:
+        command.append("--startup-only")
+
+    try:
+        completed = subprocess.run(
+            command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout", "timeout_seconds": timeout}
+
+    if completed.returncode != 0:
+        return {"status": "error", "returncode": completed.returncode, "stderr": completed.stderr[-2000:]}
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["status"] = "ok"
+    return result
+
+def run_benchmark(row_counts, source_path, queries=BENCHMARK_QUERIES, seed=BENCHMARK_SEED,
+                  timeout=BENCHMARK_TIMEOUT, workdir=None, keep=False):
+    # Only a directory the harness created itself is removed wholesale; in a user-supplied one just our own files go.
+    created = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    written = []
+
+    try:
+        for rows in row_counts:
+            dataset_path = os.path.join(workdir, f"catalog-{rows}.csv")
+            cache_dir = os.path.join(workdir, f"cache-{rows}")
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            written.extend([dataset_path, cache_dir])
+
+            start = time.perf_counter()
+            generate_catalog(source_path, rows, dataset_path, seed)
+            generate_seconds = round(time.perf_counter() - start, 4)
+            logger.info("Generated %d-row catalog in %.2fs", rows, generate_seconds)
+
+            # The cold phase trains and writes the caches; the warm phase measures a restart against them.
+            cold = run_phase(dataset_path, cache_dir, queries, seed, False, timeout)
+            logger.info("%d rows cold start: %s", rows, cold.get("startup_seconds", cold["status"]))
+            warm = run_phase(dataset_path, cache_dir, queries, seed, True, timeout) if cold["status"] == "ok" else None
+            if warm is not None:
+                logger.info("%d rows warm start: %s", rows, warm.get("startup_seconds", warm["status"]))
+
+            results.append({
+                "rows": rows,
+                "dataset_bytes": os.path.getsize(dataset_path),
+                "generate_seconds": generate_seconds,
+                "cold": cold,
+                "warm": warm
+            })
+            if not keep:
+                remove_paths([dataset_path, cache_dir])
+    finally:
+        if not keep:
+            if created:
+                shutil.rmtree(workdir, ignore_errors=True)
+            else:
+                remove_paths(written)
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__
+        },
+        "settings": {"queries": queries, "warmup": BENCHMARK_WARMUP, "seed": seed, "source": os.path.basename(source_path)},
+        "results": results
+    }
+
+def remove_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def git_commit():
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+def compare_results(baseline, current):
+    lines = []
+    baseline_rows = {result["rows"]: result for result in baseline["results"]}
+    for result in current["results"]:
+        previous = baseline_rows.get(result["rows"])
+        if previous is None:
+            continue
+        for phase in ("cold", "warm"):
+            old, new = previous.get(phase) or {}, result.get(phase) or {}
+            if "startup_seconds" in old and "startup_seconds" in new:
+                lines.append(format_change(f"{result['rows']} rows {phase} startup_seconds", old["startup_seconds"], new["startup_seconds"]))
+            if "peak_rss_mb" in old and "peak_rss_mb" in new:
+                lines.append(format_change(f"{result['rows']} rows {phase} peak_rss_mb", old["peak_rss_mb"], new["peak_rss_mb"]))
+        for endpoint, stats in (result.get("warm") or {}).get("endpoints", {}).items():
+            old = ((previous.get("warm") or {}).get("endpoints") or {}).get(endpoint, {})
+            if "p95_ms" in old and "p95_ms" in stats:
+                lines.append(format_change(f"{result['rows']} rows {endpoint} p95_ms", old["p95_ms"], stats["p95_ms"]))
+    return lines
+
+def format_change(label, old, new):
+    change = (new - old) / old * 100.0 if old else 0.0
+    return f"{label}: {old} -> {new} ({change:+.1f}%)"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommender against synthetic catalogs.")
+    parser.add_argument("--rows", type=int, nargs="+", default=BENCHMARK_ROWS)
+    parser.add_argument("--queries", type=int, default=BENCHMARK_QUERIES)
+    parser.add_argument("--seed", type=int, default=BENCHMARK_SEED)
+    parser.add_argument("--timeout", type=float, default=BENCHMARK_TIMEOUT)
+    parser.add_argument("--source", default=None)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.queries, args.seed, not args.startup_only)))
+        return
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.source is None:
+        from preprocess import find_dataset_path
+        args.source = find_dataset_path()
+
+    results = run_benchmark(args.rows, args.source, args.queries, args.seed, args.timeout, args.workdir, args.keep)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info("Wrote benchmark results to %s", args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in compare_results(baseline, results):
+            print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import sys
+import threading
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+from metrics import record_cache
+from preprocess import CATEGORY_COLUMNS, dataset_key, file_signature, find_catalog_sources, load_versioned
+
+# JSON clients such as browsers only represent integers exactly up to 2**53, so hashed ids are cut to 53 bits.
+EXERCISE_ID_BITS = 53
+
+_catalog_lock = threading.Lock()
+_loaded_catalogs = {}
+
+def freeze(array):
+    array.setflags(write=False)
+    return array
+
+def intern_strings(values):
+    interned = np.empty(len(values), dtype=object)
+    interned[:] = [sys.intern(value) if isinstance(value, str) else value for value in values]
+    return freeze(interned)
+
+def build_name_index(names):
+    name_index = {}
+    for row, name in enumerate(names.tolist()):
+        name_index.setdefault(name, row)
+    return name_index
+
+def build_name_codes(names):
+    codes, _ = pd.factorize(np.asarray(names))
+    return freeze(codes.astype(np.int32))
+
+def hash_keys(keys, columns):
+    keys = keys.assign(occurrence=keys.groupby(columns, observed=True).cumcount())
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+def build_exercise_ids(df):
+    # Rows keep the id their source gave them, namespaced by source file name, so editing a title or description and
+    # adding or removing other rows never re-keys them. Rows without a source id fall back to a hash of their title and
+    # description. Repeated keys are told apart by their occurrence number.
+    sourced = df["Unnamed: 0"].notna().to_numpy()
+    hashes = np.empty(len(df), dtype=np.uint64)
+    source_keys = pd.DataFrame({
+        "source": df["source"].astype(str).to_numpy()[sourced],
+        "id": df["Unnamed: 0"].to_numpy()[sourced].astype(np.int64)
+    })
+    hashes[sourced] = hash_keys(source_keys, ["source", "id"])
+    hashes[~sourced] = hash_keys(df.loc[~sourced, ["exercise", "description"]], ["exercise", "description"])
+    return (hashes >> np.uint64(64 - EXERCISE_ID_BITS)).astype(np.int64)
+
+def build_name_groups(name_codes):
+    order = np.argsort(name_codes, kind="stable")
+    starts = np.searchsorted(name_codes[order], np.arange(int(name_codes.max()) + 2 if len(name_codes) else 1))
+    return freeze(order), freeze(starts)
+
+def build_catalog(df):
+    names = intern_strings(df['exercise'].tolist())
+    name_codes = build_name_codes(names)
+    name_rows, name_starts = build_name_groups(name_codes)
+    exercise_ids = freeze(build_exercise_ids(df))
+    ratings = df['Rating'].astype(np.float64)
+    rating_fill = float(ratings.mean())
+    codes = {}
+    categories = {}
+    for column in CATEGORY_COLUMNS:
+        values = df[column].cat
+        codes[column] = freeze(values.codes.to_numpy().copy())
+        categories[column] = tuple(sys.intern(str(category)) for category in values.categories)
+
+    return MappingProxyType({
+        "size": len(df),
+        "names": names,
+        "name_index": MappingProxyType(build_name_index(names)),
+        "name_codes": name_codes,
+        "name_rows": name_rows,
+        "name_starts": name_starts,
+        "exercise_ids": exercise_ids,
+        "id_order": freeze(np.argsort(exercise_ids, kind="stable")),
+        "descriptions": intern_strings(df['description'].tolist()),
+        "ratings": freeze(ratings.fillna(rating_fill).to_numpy(dtype=np.float64)),
+        "rating_missing": freeze(ratings.isna().to_numpy()),
+        "rating_fill": rating_fill,
+        "codes": MappingProxyType(codes),
+        "categories": MappingProxyType(categories)
+    })
+
+def column_labels(catalog, column):
+    return np.array(catalog["categories"][column], dtype=object)[catalog["codes"][column]]
+
+def normalized_codes(catalog, column):
+    # Facet lookups are case- and whitespace-insensitive, so categories that only differ in spelling share a code.
+    labels = [category.lower().strip() for category in catalog["categories"][column]]
+    values, inverse = np.unique(np.array(labels, dtype=object), return_inverse=True)
+    return inverse[catalog["codes"][column]], values.tolist()
+
+def rows_for_name(catalog, name):
+    row = catalog["name_index"].get(name)
+    if row is None:
+        return np.empty(0, dtype=np.int64)
+    code = catalog["name_codes"][row]
+    return catalog["name_rows"][catalog["name_starts"][code]:catalog["name_starts"][code + 1]]
+
+def row_for_id(catalog, exercise_id):
+    ids = catalog["exercise_ids"]
+    order = catalog["id_order"]
+    position = np.searchsorted(ids, exercise_id, sorter=order)
+    if position < len(ids) and ids[order[position]] == exercise_id:
+        return int(order[position])
+    return None
+
+def resolve_row(catalog, name=None, exercise_id=None):
+    # An explicit id always wins; a title shared by several rows resolves to the first of them in catalog order.
+    if exercise_id is not None:
+        return row_for_id(catalog, exercise_id)
+    return catalog["name_index"].get(name)
+
+def load_versioned_catalog(dataset_path=None):
+    if dataset_path is None:
+        dataset_path = find_catalog_sources()
+
+    key = dataset_key(dataset_path)
+    signature = file_signature(dataset_path)
+    with _catalog_lock:
+        loaded = _loaded_catalogs.get(key)
+        record_cache("catalog_memory", loaded is not None and loaded["signature"] == signature)
+        if loaded is None or loaded["signature"] != signature:
+            df, version = load_versioned(dataset_path)
+            loaded = {**version, "catalog": build_catalog(df)}
+            _loaded_catalogs[key] = loaded
+
+    return loaded
+
+def load_catalog(dataset_path=None):
+    return load_versioned_catalog(dataset_path)["catalog"]
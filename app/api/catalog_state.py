@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+from preprocess import find_catalog_sources, file_signature, get_catalog_version
+from catalog import load_versioned_catalog
+from model_store import load_or_train_model, update_or_train_model
+from facets import build_facet_index
+from popularity import build_popularity_index
+from search import build_search_index
+
+logger = logging.getLogger(__name__)
+
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", 10))
+
+_reload_lock = threading.Lock()
+_snapshot = None
+
+def build_snapshot(dataset_path=None, previous=None):
+    if dataset_path is None:
+        dataset_path = find_catalog_sources()
+
+    start = time.perf_counter()
+    # Version, signature and ingest report all come from the load that produced this catalog.
+    loaded = load_versioned_catalog(dataset_path)
+    catalog = loaded["catalog"]
+
+    if previous is None:
+        model, stats = load_or_train_model(dataset_path, catalog=catalog, sha256=loaded["sha256"]), {"mode": "startup"}
+    else:
+        model, stats = update_or_train_model(
+            previous["model"], previous["catalog"], catalog, dataset_path, sha256=loaded["sha256"]
+        )
+
+    # The version is the model fingerprint, which covers the data and the model built from it, so ETags and cached
+    # responses change whenever either does.
+    snapshot = {
+        "version": model["fingerprint"],
+        "sha256": loaded["sha256"],
+        "dataset_path": dataset_path,
+        "signature": loaded["signature"],
+        "catalog": catalog,
+        "model": model,
+        "search_index": build_search_index(model["names"]),
+        "popularity": build_popularity_index(catalog),
+        "facet_index": build_facet_index(catalog),
+        "ingest": loaded["ingest"],
+        "loaded_at": time.time()
+    }
+    stats["seconds"] = round(time.perf_counter() - start, 4)
+    snapshot["stats"] = stats
+    return snapshot
+
+def current_snapshot():
+    return _snapshot
+
+def get_snapshot():
+    global _snapshot
+    if _snapshot is None:
+        with _reload_lock:
+            if _snapshot is None:
+                _snapshot = build_snapshot()
+    return _snapshot
+
+def reload_catalog(force=False):
+    global _snapshot
+    with _reload_lock:
+        previous = _snapshot
+        dataset_path = previous["dataset_path"] if previous else find_catalog_sources()
+        signature = file_signature(dataset_path)
+        if previous is not None and not force and get_catalog_version(dataset_path) == previous["sha256"]:
+            if signature != previous["signature"]:
+                # Touched but byte-identical: keep the snapshot, but under the new signature so the watcher stops
+                # re-hashing the sources on every poll.
+                _snapshot = dict(previous, signature=signature)
+            return _snapshot, False
+
+        snapshot = build_snapshot(dataset_path, previous)
+        _snapshot = snapshot
+
+    logger.info("Catalog reloaded to version %s: %s", snapshot["version"][:12], snapshot["stats"])
+    return snapshot, True
+
+def watch_catalog(interval=CATALOG_WATCH_INTERVAL):
+    def run():
+        while True:
+            time.sleep(interval)
+            snapshot = _snapshot
+            if snapshot is None:
+                continue
+            try:
+                if file_signature(snapshot["dataset_path"]) != snapshot["signature"]:
+                    reload_catalog()
+            except Exception:
+                logger.exception("Catalog reload failed")
+
+    thread = threading.Thread(target=run, name="catalog-watcher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+
+CONTENT_MODEL = os.getenv("CONTENT_MODEL", "false").lower() in ("1", "true", "yes")
+CONTENT_DIMENSIONS = int(os.getenv("CONTENT_DIMENSIONS", 64))
+CONTENT_WEIGHT = float(os.getenv("CONTENT_WEIGHT", 0.5))
+CONTENT_MAX_TERMS = int(os.getenv("CONTENT_MAX_TERMS", 20000))
+LSH_TABLES = int(os.getenv("LSH_TABLES", 8))
+LSH_BITS = int(os.getenv("LSH_BITS", 12))
+LSH_MIN_ROWS = int(os.getenv("LSH_MIN_ROWS", 10000))
+LSH_SEED = 490
+LSH_ARRAYS = ["lsh_planes", "lsh_center", "lsh_order", "lsh_codes"]
+
+def content_settings():
+    if not CONTENT_MODEL:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "dimensions": CONTENT_DIMENSIONS,
+        "weight": CONTENT_WEIGHT,
+        "max_terms": CONTENT_MAX_TERMS,
+        "lsh_tables": LSH_TABLES,
+        "lsh_bits": LSH_BITS,
+        "lsh_min_rows": LSH_MIN_ROWS
+    }
+
+def normalize_rows(features):
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return features / norms
+
+def encode_descriptions(descriptions, dimensions=CONTENT_DIMENSIONS):
+    # scikit-learn takes over a second to import and is only needed when the content model is trained.
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(
+        max_features=CONTENT_MAX_TERMS,
+        stop_words="english",
+        sublinear_tf=True,
+        dtype=np.float32
+    )
+    tfidf = vectorizer.fit_transform(descriptions)
+
+    components = min(dimensions, tfidf.shape[1] - 1, tfidf.shape[0] - 1)
+    if components < 1:
+        return np.zeros((tfidf.shape[0], 0), dtype=np.float32)
+    reduced = TruncatedSVD(n_components=components, random_state=LSH_SEED).fit_transform(tfidf)
+    return normalize_rows(reduced.astype(np.float32))
+
+def combine_features(categorical, text, weight=CONTENT_WEIGHT):
+    combined = np.hstack([np.sqrt(1.0 - weight) * categorical, np.sqrt(weight) * text])
+    return normalize_rows(combined.astype(np.float32))
+
+def build_lsh_index(features, tables=LSH_TABLES, bits=LSH_BITS, seed=LSH_SEED):
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((tables, features.shape[1], bits)).astype(np.float32)
+    # Hyperplanes pass through the origin, so centering keeps skewed features from collapsing into a few buckets.
+    center = features.mean(axis=0).astype(np.float32)
+    codes = hash_vectors(planes, center, features)
+    order = np.argsort(codes, axis=1, kind="stable").astype(np.int32)
+    return {
+        "lsh_planes": planes,
+        "lsh_center": center,
+        "lsh_order": order,
+        "lsh_codes": np.take_along_axis(codes, order, axis=1)
+    }
+
+def hash_vectors(planes, center, vectors):
+    weights = np.left_shift(np.int64(1), np.arange(planes.shape[2], dtype=np.int64))
+    bits = np.einsum("nd,tdb->tnb", vectors - center, planes) > 0
+    return bits.astype(np.int64) @ weights
+
+def lsh_candidates(index, vectors):
+    codes = hash_vectors(index["lsh_planes"], index["lsh_center"], vectors)
+    candidates = []
+    for query in range(vectors.shape[0]):
+        rows = []
+        for table in range(codes.shape[0]):
+            sorted_codes = index["lsh_codes"][table]
+            start = np.searchsorted(sorted_codes, codes[table, query], side="left")
+            stop = np.searchsorted(sorted_codes, codes[table, query], side="right")
+            rows.append(index["lsh_order"][table, start:stop])
+        candidates.append(np.unique(np.concatenate(rows)))
+    return candidates
+
+def lsh_neighbors(features, index, k, block_size=1024):
+    n = features.shape[0]
+    k = max(0, min(k, n - 1))
+    neighbor_ids = np.full((n, k), -1, dtype=np.int32)
+    neighbor_scores = np.full((n, k), -np.inf, dtype=np.float32)
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        for row, candidates in zip(range(start, stop), lsh_candidates(index, features[start:stop])):
+            candidates = candidates[candidates != row]
+            if len(candidates) < k:
+                candidates = np.delete(np.arange(n), row)
+            scores = features[candidates] @ features[row]
+            top = np.lexsort((candidates, -scores))[:k]
+            neighbor_ids[row] = candidates[top]
+            neighbor_scores[row] = scores[top]
+
+    return neighbor_ids, neighbor_scores
@@ -0,0 +1,73 @@
+from itertools import combinations, product
+import numpy as np
+import pandas as pd
+from catalog import normalized_codes
+
+FACET_COLUMNS = {"muscle": "muscle_group", "equipment": "Equipment", "type": "Type"}
+FILTER_COLUMNS = {**FACET_COLUMNS, "level": "Level"}
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+def normalize_values(values):
+    if not values:
+        return [None]
+    normalized = sorted({str(value).lower().strip() for value in values} - {""})
+    return normalized or [None]
+
+def build_facet_index(catalog):
+    facets = list(FACET_COLUMNS)
+    codes = {}
+    values = {}
+    for facet, column in FACET_COLUMNS.items():
+        codes[facet], values[facet] = normalized_codes(catalog, column)
+    keys = pd.DataFrame(codes)
+
+    rows = {(None,) * len(facets): np.arange(catalog["size"])}
+    for size in range(1, len(facets) + 1):
+        for subset in combinations(facets, size):
+            for key_codes, ids in keys.groupby(list(subset), sort=False).indices.items():
+                if not isinstance(key_codes, tuple):
+                    key_codes = (key_codes,)
+                lookup = {facet: values[facet][code] for facet, code in zip(subset, key_codes)}
+                rows[tuple(lookup.get(facet) for facet in facets)] = ids
+
+    return {
+        "facets": facets,
+        "values": {facet: sorted(values[facet][code] for code in np.unique(codes[facet])) for facet in facets},
+        "rows": rows,
+        "size": catalog["size"],
+        "masks": build_filter_masks(catalog)
+    }
+
+def build_filter_masks(catalog):
+    # One packed bit per catalog row for every facet value, so filters combine with byte-wide AND/OR.
+    masks = {}
+    for facet, column in FILTER_COLUMNS.items():
+        codes, values = normalized_codes(catalog, column)
+        masks[facet] = {value: np.packbits(codes == code) for code, value in enumerate(values)}
+    return masks
+
+def filter_mask(index, muscles=None, equipment=None, types=None, levels=None):
+    selected = None
+    for facet, requested in zip(FILTER_COLUMNS, (muscles, equipment, types, levels)):
+        values = normalize_values(requested)
+        if values == [None]:
+            continue
+        facet_mask = np.zeros((index["size"] + 7) // 8, dtype=np.uint8)
+        for value in values:
+            bits = index["masks"][facet].get(value)
+            if bits is not None:
+                facet_mask |= bits
+        selected = facet_mask if selected is None else selected & facet_mask
+
+    if selected is None:
+        return None
+    return np.unpackbits(selected, count=index["size"]).astype(bool)
+
+def lookup_rows(index, muscles=None, equipment=None, types=None):
+    parts = [
+        index["rows"].get(key, EMPTY_ROWS)
+        for key in product(normalize_values(muscles), normalize_values(equipment), normalize_values(types))
+    ]
+    if len(parts) == 1:
+        return parts[0]
+    return np.sort(np.concatenate(parts))
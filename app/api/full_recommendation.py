@@ -1,10 +1,10 @@
-import pandas as pd
-import os
-from preprocess import load_and_preprocess
+import logging
+import numpy as np
+from catalog_state import get_snapshot
+from facets import lookup_rows, EMPTY_ROWS
+from metrics import stage_timer
 
-df = load_and_preprocess()
-
-muscle_column = "muscle_group"  
+logger = logging.getLogger(__name__)
 
 SPLIT_TYPES = {
     "total_body": [
@@ -34,235 +34,204 @@ SPLIT_TYPES = {
     }
 }
 
-def generate_full_workout_plan(split_type, equipment_list=None, exercise_type_list=None):
+MUSCLE_MAPPING = {
+    "Chest": ["chest", "pectorals"],
+    "Back": ["back", "lats", "middle back", "lower back"],
+    "Shoulders": ["shoulders", "delts", "deltoids"],
+    "Biceps": ["biceps", "arms"],
+    "Triceps": ["triceps", "arms"],
+    "Quadriceps": ["quadriceps", "quads", "legs"],
+    "Hamstrings": ["hamstrings", "legs"],
+    "Calves": ["calves", "legs"],
+    "Abdominals": ["abdominals", "abs", "core"],
+    "Lats": ["lats", "back"],
+    "Middle Back": ["middle back", "back"],
+    "Lower Back": ["lower back", "back"],
+    "Traps": ["traps", "trapezius", "shoulders"],
+    "Forearms": ["forearms", "arms"],
+    "Glutes": ["glutes", "buttocks", "legs"],
+    "Abductors": ["abductors", "legs"],
+    "Adductors": ["adductors", "legs"],
+    "Neck": ["neck", "traps"]
+}
+
+EXERCISES_PER_MUSCLE = {"bro_split": 3}
+
+def split_groups(split_type):
+    muscles = SPLIT_TYPES[split_type]
+    if isinstance(muscles, list):
+        return {split_type: muscles}
+    return muscles
+
+def find_missing_muscles(facet_index):
+    expected_muscles = set()
+    for split_type in SPLIT_TYPES:
+        for muscles in split_groups(split_type).values():
+            expected_muscles.update(muscles)
+
+    return sorted(muscle for muscle in expected_muscles if len(lookup_rows(facet_index, [muscle])) == 0)
+
+def candidate_pool(facet_index, missing_muscles, muscle, equipment_list, exercise_type_list):
+    rows = lookup_rows(facet_index, [muscle], equipment_list, exercise_type_list)
+
+    if len(rows) == 0 and missing_muscles:
+        for alt_muscle in MUSCLE_MAPPING.get(muscle, []):
+            alt_rows = lookup_rows(facet_index, [alt_muscle], equipment_list, exercise_type_list)
+            if len(alt_rows) > 0:
+                logger.debug("Using muscle mapping fallback for %s: %s (%d exercises)", muscle, alt_muscle, len(alt_rows))
+                return alt_rows
+
+    return rows
+
+def sample_pools(pools, counts, rng):
+    sizes = np.array([len(pool) for pool in pools], dtype=np.int64)
+    take = np.minimum(sizes, counts)
+    if sizes.sum() == 0:
+        return [EMPTY_ROWS for _ in pools]
+
+    rows = np.concatenate(pools)
+    labels = np.repeat(np.arange(len(pools)), sizes)
+    starts = np.cumsum(sizes) - sizes
+
+    order = np.lexsort((rng.random(len(rows)), labels))
+    rank = np.arange(len(rows)) - starts[labels]
+    chosen = rows[order[rank < take[labels]]]
+
+    return np.split(chosen, np.cumsum(take)[:-1])
+
+def sample_pools_distinct(pools, counts, rng, name_codes):
+    # Duplicate titles live on separate rows, so "no repeat" is enforced on name codes rather than row ids.
+    taken = np.zeros(int(name_codes.max()) + 1 if len(name_codes) else 0, dtype=bool)
+    samples = []
+    for pool in pools:
+        shuffled = pool[rng.permutation(len(pool))]
+        picks = []
+        for row in shuffled[~taken[name_codes[shuffled]]].tolist():
+            if len(picks) == counts:
+                break
+            if not taken[name_codes[row]]:
+                taken[name_codes[row]] = True
+                picks.append(row)
+        if len(picks) < counts:
+            # Pool exhausted by earlier days: top up with repeats rather than leaving the slot short.
+            chosen = set(picks)
+            picks.extend([row for row in shuffled.tolist() if row not in chosen][:counts - len(picks)])
+        samples.append(np.array(picks, dtype=np.int64))
+    return samples
+
+def resolve_filters(facet_index, equipment_list, exercise_type_list):
+    if equipment_list or exercise_type_list:
+        filtered_size = len(lookup_rows(facet_index, None, equipment_list, exercise_type_list))
+        logger.debug("After filters, dataset size: %d", filtered_size)
+        if filtered_size == 0:
+            logger.info("No exercises found with the specified filters. Using all exercises.")
+            return [], []
+    return equipment_list, exercise_type_list
+
+def build_plans(facet_index, model, missing_muscles, split_type, equipment_list, exercise_type_list,
+                rng, weeks=1, no_repeat=False, pools=None):
+    if pools is None:
+        pools = {}
+    exercise_names = model["names"]
+    exercise_ids = model["exercise_ids"]
+    name_codes = model["name_codes"]
+    groups = split_groups(split_type)
+    slots = [(week, key, muscle) for week in range(weeks) for key, muscles in groups.items() for muscle in muscles]
+
+    with stage_timer("plan_pools"):
+        slot_pools = []
+        for week, key, muscle in slots:
+            pool_key = (muscle, tuple(equipment_list), tuple(exercise_type_list))
+            if pool_key not in pools:
+                pools[pool_key] = candidate_pool(facet_index, missing_muscles, muscle, equipment_list, exercise_type_list)
+                if len(pools[pool_key]) == 0:
+                    logger.debug("No exercises found for muscle group: %s in %s", muscle, key)
+            slot_pools.append(pools[pool_key])
+
+    with stage_timer("plan_sample"):
+        counts = EXERCISES_PER_MUSCLE.get(split_type, 2)
+        if no_repeat:
+            samples = sample_pools_distinct(slot_pools, counts, rng, name_codes)
+        else:
+            samples = sample_pools(slot_pools, counts, rng)
+
+        plans = [{key: [] for key in groups} for _ in range(weeks)]
+        plan_ids = [{key: [] for key in groups} for _ in range(weeks)]
+        for (week, key, muscle), rows in zip(slots, samples):
+            plans[week][key].extend(exercise_names[rows].tolist())
+            plan_ids[week][key].extend(exercise_ids[rows].tolist())
+
+    return plans, plan_ids
+
+def generate_full_workout_plan(split_type, equipment_list=None, exercise_type_list=None, rng=None, with_ids=False,
+                               snapshot=None):
     if equipment_list is None:
         equipment_list = []
     if exercise_type_list is None:
         exercise_type_list = []
-        
-    workout_plan = {}
-    filtered_df = df.copy()
-    
-    print(f"Original dataset size: {len(filtered_df)}")
-    print(f"Equipment filter: {equipment_list}")
-    print(f"Exercise type filter: {exercise_type_list}")
-    
-    print(f"Columns in dataframe: {filtered_df.columns.tolist()}")
-    unique_muscles = filtered_df[muscle_column].unique()
-    print(f"\nUnique muscle groups in dataset: {unique_muscles.tolist()}")
-
-    all_expected_muscles = set()
-    for split_type_muscles in SPLIT_TYPES.values():
-        if isinstance(split_type_muscles, list):
-            all_expected_muscles.update(split_type_muscles)
-        elif isinstance(split_type_muscles, dict):
-            for muscles in split_type_muscles.values():
-                all_expected_muscles.update(muscles)
-    
-    print("\nChecking if expected muscle groups exist in the dataset:")
-    missing_muscles = []
-    for muscle in all_expected_muscles:
-        matching_rows = filtered_df[filtered_df[muscle_column].str.lower() == muscle.lower()]
-        print(f"  {muscle}: {len(matching_rows)} exercises")
-        if len(matching_rows) == 0:
-            missing_muscles.append(muscle)
-    
+    if rng is None:
+        rng = np.random.default_rng()
+
+    if split_type not in SPLIT_TYPES:
+        return ({}, {}) if with_ids else {}
+
+    snapshot = snapshot or get_snapshot()
+    facet_index = snapshot["facet_index"]
+    missing_muscles = find_missing_muscles(facet_index)
     if missing_muscles:
-        print(f"\nWARNING: The following muscle groups are not found in the dataset: {missing_muscles}")
-        print("Creating a muscle group mapping for fallback...")
-        
-        muscle_mapping = {
-            "Chest": ["chest", "pectorals"],
-            "Back": ["back", "lats", "middle back", "lower back"],
-            "Shoulders": ["shoulders", "delts", "deltoids"],
-            "Biceps": ["biceps", "arms"],
-            "Triceps": ["triceps", "arms"],
-            "Quadriceps": ["quadriceps", "quads", "legs"],
-            "Hamstrings": ["hamstrings", "legs"],
-            "Calves": ["calves", "legs"],
-            "Abdominals": ["abdominals", "abs", "core"],
-            "Lats": ["lats", "back"],
-            "Middle Back": ["middle back", "back"],
-            "Lower Back": ["lower back", "back"],
-            "Traps": ["traps", "trapezius", "shoulders"],
-            "Forearms": ["forearms", "arms"],
-            "Glutes": ["glutes", "buttocks", "legs"],
-            "Abductors": ["abductors", "legs"],
-            "Adductors": ["adductors", "legs"],
-            "Neck": ["neck", "traps"]
-        }
-    
-    print("\nSample data (first 3 rows):")
-    for i, row in filtered_df.head(3).iterrows():
-        print(f"Row {i}:")
-        print(f"  Exercise: {row['exercise']}")
-        print(f"  Equipment: {row['Equipment']}")
-        print(f"  Type: {row['Type']}")
-        print(f"  Muscle Group: {row[muscle_column]}")
-    
-    if equipment_list:
-        equipment_lower = [equip.lower() for equip in equipment_list]
-        
-        unique_equipment = filtered_df['Equipment'].str.lower().unique().tolist()
-        print(f"\nUnique equipment values in dataset: {unique_equipment}")
-        print(f"Looking for equipment in: {equipment_lower}")
-        
-        for equip in equipment_lower:
-            matching_rows = filtered_df[filtered_df['Equipment'].str.lower() == equip]
-            print(f"Equipment '{equip}' matches {len(matching_rows)} rows")
-            if len(matching_rows) > 0:
-                print(f"Sample matching exercises: {matching_rows['exercise'].head(3).tolist()}")
-        
-        filtered_df = filtered_df[filtered_df['Equipment'].str.lower().isin(equipment_lower)]
-        print(f"After equipment filter, dataset size: {len(filtered_df)}")
-        if len(filtered_df) == 0:
-            print(f"Warning: No exercises found with equipment in {equipment_list}")
-    
-    if exercise_type_list and len(filtered_df) > 0:
-        exercise_type_lower = [ex_type.lower() for ex_type in exercise_type_list]
-        
-        unique_types = filtered_df['Type'].str.lower().unique().tolist()
-        print(f"\nUnique exercise type values in dataset: {unique_types}")
-        print(f"Looking for exercise types in: {exercise_type_lower}")
-        
-        for ex_type in exercise_type_lower:
-            matching_rows = filtered_df[filtered_df['Type'].str.lower() == ex_type]
-            print(f"Exercise type '{ex_type}' matches {len(matching_rows)} rows")
-            if len(matching_rows) > 0:
-                print(f"Sample matching exercises: {matching_rows['exercise'].head(3).tolist()}")
-        
-        filtered_df = filtered_df[filtered_df['Type'].str.lower().isin(exercise_type_lower)]
-        
-        print(f"After exercise type filter, dataset size: {len(filtered_df)}")
-        
-        if len(filtered_df) == 0:
-            print(f"Warning: No exercises found with exercise type in {exercise_type_list}")
-    
-    if len(filtered_df) == 0:
-        print(f"No exercises found with the specified filters. Using all exercises.")
-        filtered_df = df.copy()
-    else:
-        print("\nSample filtered exercises:")
-        for i, row in filtered_df.head(5).iterrows():
-            print(f"  {row['exercise']} - Equipment: {row['Equipment']}, Type: {row['Type']}")
-
-    if split_type == "total_body":
-        muscle_exercises = {}
-        for muscle in SPLIT_TYPES["total_body"]:
-            muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == muscle.lower()]
-            
-            if len(muscle_df) == 0 and 'muscle_mapping' in locals():
-                print(f"Using muscle mapping fallback for {muscle}")
-                for alt_muscle in muscle_mapping.get(muscle, []):
-                    alt_muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == alt_muscle.lower()]
-                    if len(alt_muscle_df) > 0:
-                        print(f"  Found {len(alt_muscle_df)} exercises for alternative muscle: {alt_muscle}")
-                        muscle_df = alt_muscle_df
-                        break
-            
-            if len(muscle_df) > 0:
-                muscle_exercises[muscle] = muscle_df.sample(n=min(len(muscle_df), 2))["exercise"].tolist()
-            else:
-                print(f"No exercises found for muscle group: {muscle}")
-                muscle_exercises[muscle] = []
-        
-        all_exercises = []
-        for muscle, exercises in muscle_exercises.items():
-            all_exercises.extend(exercises)
-        
-        if all_exercises:
-            workout_plan["total_body"] = all_exercises
-        else:
-            workout_plan["total_body"] = []
-
-    elif split_type == "upper_lower":
-        for key in ["upper", "lower"]:
-            muscle_exercises = {}
-            
-            for muscle in SPLIT_TYPES["upper_lower"][key]:
-                muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == muscle.lower()]
-                
-                if len(muscle_df) == 0 and 'muscle_mapping' in locals():
-                    print(f"Using muscle mapping fallback for {muscle} in {key} split")
-                    for alt_muscle in muscle_mapping.get(muscle, []):
-                        alt_muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == alt_muscle.lower()]
-                        if len(alt_muscle_df) > 0:
-                            print(f"  Found {len(alt_muscle_df)} exercises for alternative muscle: {alt_muscle}")
-                            muscle_df = alt_muscle_df
-                            break
-                
-                if len(muscle_df) > 0:
-                    muscle_exercises[muscle] = muscle_df.sample(n=min(len(muscle_df), 2))["exercise"].tolist()
-                else:
-                    print(f"No exercises found for muscle group: {muscle} in {key} split")
-                    muscle_exercises[muscle] = []
-            
-            split_exercises = []
-            for muscle, exercises in muscle_exercises.items():
-                split_exercises.extend(exercises)
-            
-            workout_plan[key] = split_exercises
-
-    elif split_type == "push_pull_legs":
-        for key in ["push", "pull", "legs"]:
-            muscle_exercises = {}
-            
-            for muscle in SPLIT_TYPES["push_pull_legs"][key]:
-                muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == muscle.lower()]
-                
-                if len(muscle_df) == 0 and 'muscle_mapping' in locals():
-                    print(f"Using muscle mapping fallback for {muscle} in {key} split")
-                    for alt_muscle in muscle_mapping.get(muscle, []):
-                        alt_muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == alt_muscle.lower()]
-                        if len(alt_muscle_df) > 0:
-                            print(f"  Found {len(alt_muscle_df)} exercises for alternative muscle: {alt_muscle}")
-                            muscle_df = alt_muscle_df
-                            break
-
-                if len(muscle_df) > 0:
-                    muscle_exercises[muscle] = muscle_df.sample(n=min(len(muscle_df), 2))["exercise"].tolist()
-                else:
-                    print(f"No exercises found for muscle group: {muscle} in {key} split")
-                    muscle_exercises[muscle] = []
-            
-            split_exercises = []
-            for muscle, exercises in muscle_exercises.items():
-                split_exercises.extend(exercises)
-            
-            workout_plan[key] = split_exercises
-
-    elif split_type == "bro_split":
-        for day, muscles in SPLIT_TYPES["bro_split"].items():
-            muscle_exercises = {}
-            
-            for muscle in muscles:
-                muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == muscle.lower()]
-                
-                if len(muscle_df) == 0 and 'muscle_mapping' in locals():
-                    print(f"Using muscle mapping fallback for {muscle} in {day}")
-                    for alt_muscle in muscle_mapping.get(muscle, []):
-                        alt_muscle_df = filtered_df[filtered_df[muscle_column].str.lower() == alt_muscle.lower()]
-                        if len(alt_muscle_df) > 0:
-                            print(f"  Found {len(alt_muscle_df)} exercises for alternative muscle: {alt_muscle}")
-                            muscle_df = alt_muscle_df
-                            break
-                
-                if len(muscle_df) > 0:
-                    muscle_exercises[muscle] = muscle_df.sample(n=min(len(muscle_df), 3))["exercise"].tolist()
-                else:
-                    print(f"No exercises found for muscle group: {muscle} in {day}")
-                    muscle_exercises[muscle] = []
-            
-            day_exercises = []
-            for muscle, exercises in muscle_exercises.items():
-                day_exercises.extend(exercises)
-            
-            workout_plan[day] = day_exercises
-    
-    print("\nFinal workout plan:")
-    for category, exercises in workout_plan.items():
-        print(f"  {category}: {len(exercises)} exercises")
-        if exercises:
-            print(f"    Sample: {exercises[:2]}")
+        logger.debug("The following muscle groups are not found in the dataset: %s", missing_muscles)
+
+    logger.debug("Equipment filter: %s, exercise type filter: %s", equipment_list, exercise_type_list)
+
+    with stage_timer("plan_filter"):
+        equipment_list, exercise_type_list = resolve_filters(facet_index, equipment_list, exercise_type_list)
 
+    plans, plan_ids = build_plans(
+        facet_index, snapshot["model"], missing_muscles, split_type, equipment_list, exercise_type_list, rng
+    )
+    workout_plan = plans[0]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for category, exercises in workout_plan.items():
+            logger.debug("Final workout plan %s: %d exercises", category, len(exercises))
+
+    if with_ids:
+        return workout_plan, plan_ids[0]
     return workout_plan
+
+def generate_workout_plans(specs, no_repeat=False, snapshot=None):
+    snapshot = snapshot or get_snapshot()
+    facet_index = snapshot["facet_index"]
+    missing_muscles = find_missing_muscles(facet_index)
+    # Specs with the same muscle and filters reuse one candidate pool instead of re-running the facet lookup.
+    pools = {}
+    filters = {}
+    results = []
+
+    for spec in specs:
+        split_type = spec["split_type"]
+        equipment_list = list(spec.get("equipment") or [])
+        exercise_type_list = list(spec.get("exercise_type") or [])
+        seed = spec.get("seed")
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+
+        filter_key = (tuple(equipment_list), tuple(exercise_type_list))
+        if filter_key not in filters:
+            with stage_timer("plan_filter"):
+                filters[filter_key] = resolve_filters(facet_index, equipment_list, exercise_type_list)
+        equipment_list, exercise_type_list = filters[filter_key]
+
+        plans, plan_ids = build_plans(
+            facet_index, snapshot["model"], missing_muscles, split_type, equipment_list, exercise_type_list,
+            np.random.default_rng(seed), spec.get("weeks", 1), no_repeat, pools
+        )
+        results.append({"split_type": split_type, "seed": seed, "weeks": plans, "week_ids": plan_ids})
+
+    return results
+
+def warm_up():
+    snapshot = get_snapshot()
+    rng = np.random.default_rng(0)
+    for split_type in SPLIT_TYPES:
+        generate_full_workout_plan(split_type, rng=rng, snapshot=snapshot)
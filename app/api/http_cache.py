@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import make_response, request
+from catalog_state import current_snapshot, get_snapshot
+from metrics import record_cache
+
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 300))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 4096))
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+
+_lock = threading.Lock()
+_responses = OrderedDict()
+_cache_version = None
+
+def normalized_params(args):
+    params = []
+    for key in sorted(args):
+        # Only surrounding whitespace is dropped; routes echo their inputs, so case must stay part of the key.
+        values = [value.strip() for value in args.getlist(key)]
+        params.extend((key, value) for value in values if value)
+    return tuple(params)
+
+def make_etag(route, params, version):
+    digest = hashlib.sha256(repr((route, params, version)).encode("utf-8")).hexdigest()
+    return '"' + digest[:32] + '"'
+
+def gzip_etag(etag):
+    return etag[:-1] + '-gzip"'
+
+def etag_matches(header, etags):
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match uses weak comparison, so a W/ prefix still counts as a match.
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+def cache_get(key, version):
+    global _cache_version
+    with _lock:
+        if _cache_version != version:
+            # Only the live snapshot's version resets the cache; a late request still holding an older snapshot
+            # bypasses it rather than evicting everything.
+            if version != current_snapshot()["version"]:
+                return None
+            _responses.clear()
+            _cache_version = version
+        entry = _responses.get(key)
+        if entry is not None:
+            _responses.move_to_end(key)
+        return entry
+
+def cache_set(key, entry, version):
+    with _lock:
+        if _cache_version != version:
+            return
+        _responses[key] = entry
+        _responses.move_to_end(key)
+        while len(_responses) > RESPONSE_CACHE_SIZE:
+            _responses.popitem(last=False)
+
+def build_entry(response):
+    body = response.get_data()
+    compressed = gzip.compress(body, GZIP_LEVEL, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+    return {"body": body, "gzip": compressed, "mimetype": response.mimetype}
+
+def cached_response(max_age=HTTP_CACHE_MAX_AGE):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            route = request.url_rule.rule
+            params = normalized_params(request.args)
+            # The view gets the snapshot the ETag and cache key were computed from, so a reload mid-request can't tag
+            # one snapshot's body with another's version.
+            snapshot = get_snapshot()
+            version = snapshot["version"]
+            etag = make_etag(route, params, version)
+            cache_control = f"public, max-age={max_age}"
+
+            accepts_gzip = "gzip" in request.headers.get("Accept-Encoding", "").lower()
+            if etag_matches(request.headers.get("If-None-Match"), (etag, gzip_etag(etag))):
+                response = make_response("", 304)
+                response.headers["ETag"] = etag
+                response.headers["Cache-Control"] = cache_control
+                response.headers["Vary"] = "Accept-Encoding"
+                return response
+
+            key = (route, params, version)
+            entry = cache_get(key, version)
+            record_cache("http_response", entry is not None)
+            if entry is None:
+                response = make_response(view(*args, snapshot=snapshot, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = build_entry(response)
+                cache_set(key, entry, version)
+
+            if accepts_gzip and entry["gzip"] is not None:
+                response = make_response(entry["gzip"])
+                response.headers["Content-Encoding"] = "gzip"
+                response.headers["ETag"] = gzip_etag(etag)
+            else:
+                response = make_response(entry["body"])
+                response.headers["ETag"] = etag
+            response.mimetype = entry["mimetype"]
+            response.headers["Cache-Control"] = cache_control
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+        return wrapper
+    return decorator
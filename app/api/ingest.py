@@ -0,0 +1,137 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 50000))
+RATING_RANGE = (0.0, 10.0)
+
+SOURCE_DTYPES = {
+    "Unnamed: 0": "Int64",
+    "Title": "str",
+    "Desc": "str",
+    "Type": "str",
+    "BodyPart": "str",
+    "Equipment": "str",
+    "Level": "str",
+    "Rating": "str"
+}
+COLUMN_NAMES = {"Title": "exercise", "Desc": "description", "BodyPart": "muscle_group"}
+TEXT_COLUMNS = ['description', 'Type', 'muscle_group', 'Equipment', 'Level']
+CATEGORY_COLUMNS = ['Type', 'muscle_group', 'Equipment', 'Level']
+OUTPUT_COLUMNS = ["source", "Unnamed: 0", "exercise", "description", *CATEGORY_COLUMNS, "Rating"]
+
+def source_columns(path):
+    header = pd.read_csv(path, nrows=0).columns
+    missing = [column for column in ("Title", "BodyPart") if column not in header]
+    if missing:
+        raise ValueError(f"{path} is missing required columns: {missing}")
+    return [column for column in SOURCE_DTYPES if column in header]
+
+def clean_chunk(chunk, report):
+    chunk = chunk.rename(columns=COLUMN_NAMES)
+    for source_column, dtype in SOURCE_DTYPES.items():
+        column = COLUMN_NAMES.get(source_column, source_column)
+        if column not in chunk:
+            # Optional columns a source lacks are created empty with their usual dtype, so the string checks below still apply.
+            chunk[column] = pd.Series(pd.NA if dtype == "Int64" else np.nan, index=chunk.index, dtype=dtype)
+
+    chunk['exercise'] = chunk['exercise'].str.lower().str.strip()
+    missing_title = chunk['exercise'].isna() | (chunk['exercise'] == "")
+    report["rejected"]["missing_title"] += int(missing_title.sum())
+    chunk = chunk[~missing_title]
+
+    # Unparseable or out-of-range ratings are treated as missing; the catalog decides how missing ratings are filled.
+    rating = pd.to_numeric(chunk['Rating'], errors='coerce')
+    invalid = rating.notna() & ~rating.between(*RATING_RANGE)
+    invalid |= rating.isna() & chunk['Rating'].notna() & (chunk['Rating'].str.strip() != "")
+    report["invalid_ratings"] += int(invalid.sum())
+    chunk = chunk.assign(Rating=rating.where(~invalid))
+
+    chunk[TEXT_COLUMNS] = chunk[TEXT_COLUMNS].fillna("Unknown")
+    chunk[CATEGORY_COLUMNS] = chunk[CATEGORY_COLUMNS].astype("category")
+    # The source file name namespaces the source's own "Unnamed: 0" ids when the catalog assigns exercise ids.
+    chunk["source"] = pd.Categorical([os.path.basename(report["path"])] * len(chunk))
+    return chunk[OUTPUT_COLUMNS]
+
+def title_hashes(titles):
+    return pd.util.hash_array(titles.to_numpy(dtype=object))
+
+def ingest_source(path, seen_titles, chunk_rows=INGEST_CHUNK_ROWS):
+    report = {
+        "path": os.path.abspath(path),
+        "rows_read": 0,
+        "rows_accepted": 0,
+        "invalid_ratings": 0,
+        "rejected": {"missing_title": 0, "duplicate_title": 0}
+    }
+    columns = source_columns(path)
+    chunks = []
+    source_titles = []
+
+    reader = pd.read_csv(path, usecols=columns, dtype={c: SOURCE_DTYPES[c] for c in columns}, chunksize=chunk_rows)
+    for chunk in reader:
+        report["rows_read"] += len(chunk)
+        chunk = clean_chunk(chunk, report)
+
+        # Duplicate titles within one source are kept as-is; only titles already ingested from an earlier source are dropped.
+        hashes = title_hashes(chunk['exercise'])
+        duplicate = np.isin(hashes, seen_titles)
+        report["rejected"]["duplicate_title"] += int(duplicate.sum())
+        chunk = chunk[~duplicate]
+        source_titles.append(hashes[~duplicate])
+
+        report["rows_accepted"] += len(chunk)
+        chunks.append(chunk)
+
+    titles = np.concatenate(source_titles) if source_titles else np.empty(0, dtype=np.uint64)
+    return chunks, titles, report
+
+def concat_chunks(chunks):
+    if not chunks:
+        return pd.DataFrame({
+            "source": pd.Categorical([]),
+            "Unnamed: 0": pd.array([], dtype="Int64"),
+            "exercise": pd.Series([], dtype="str"),
+            "description": pd.Series([], dtype="str"),
+            **{column: pd.Categorical([]) for column in CATEGORY_COLUMNS},
+            "Rating": pd.Series([], dtype="float64")
+        })
+
+    category_columns = ["source", *CATEGORY_COLUMNS]
+    categories = {
+        column: union_categoricals([chunk[column] for chunk in chunks], sort_categories=True)
+        for column in category_columns
+    }
+    df = pd.concat([chunk.drop(columns=category_columns) for chunk in chunks], ignore_index=True)
+    for column in category_columns:
+        df[column] = categories[column]
+    return df[OUTPUT_COLUMNS]
+
+def ingest_sources(paths, chunk_rows=INGEST_CHUNK_ROWS):
+    chunks = []
+    reports = []
+    seen_titles = np.empty(0, dtype=np.uint64)
+
+    for path in paths:
+        source_chunks, titles, report = ingest_source(path, seen_titles, chunk_rows)
+        chunks.extend(source_chunks)
+        seen_titles = np.union1d(seen_titles, titles)
+        reports.append(report)
+        logger.info(
+            "Ingested %s: %d read, %d accepted, rejected %s, %d invalid ratings",
+            path, report["rows_read"], report["rows_accepted"], report["rejected"], report["invalid_ratings"]
+        )
+
+    df = concat_chunks(chunks)
+    if not df['Unnamed: 0'].isna().any():
+        df['Unnamed: 0'] = df['Unnamed: 0'].astype("int64")
+
+    return df, {
+        "sources": reports,
+        "rows": len(df),
+        "rejected": sum(sum(report["rejected"].values()) for report in reports)
+    }
@@ -0,0 +1,130 @@
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {
+    "http_requests_total": ("counter", "HTTP requests handled, by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency, by route and method."),
+    "stage_duration_seconds": ("histogram", "Time spent in internal processing stages."),
+    "cache_requests_total": ("counter", "Cache lookups, by cache and result."),
+    "cache_hit_ratio": ("gauge", "Fraction of cache lookups that were hits."),
+    "profiles_captured_total": ("counter", "Requests profiled with cProfile, by route and reason."),
+}
+
+def label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+def inc(name, labels=None, amount=1):
+    key = (name, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, labels=None, buckets=DEFAULT_BUCKETS):
+    key = (name, label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            _histograms[key] = histogram
+        for i, bound in enumerate(histogram["buckets"]):
+            if value <= bound:
+                histogram["counts"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - start, {"stage": stage})
+
+def record_cache(cache, hit):
+    inc("cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def format_labels(labels, extra=None):
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    escaped = []
+    for name, value in items:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+def cache_hit_ratios():
+    totals = {}
+    for (name, labels), value in _counters.items():
+        if name != "cache_requests_total":
+            continue
+        labels = dict(labels)
+        hits, lookups = totals.get(labels["cache"], (0, 0))
+        if labels["result"] == "hit":
+            hits += value
+        totals[labels["cache"]] = (hits, lookups + value)
+    return {cache: hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+def render_prometheus():
+    lines = []
+    described = set()
+
+    def describe(name):
+        if name in described or name not in _help:
+            return
+        kind, text = _help[name]
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        described.add(name)
+
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            describe(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for cache, ratio in sorted(cache_hit_ratios().items()):
+            describe("cache_hit_ratio")
+            lines.append(f"cache_hit_ratio{format_labels([('cache', cache)])} {ratio:.6f}")
+
+        for (name, labels), histogram in sorted(_histograms.items()):
+            describe(name)
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                lines.append(f"{name}_bucket{format_labels(labels, {'le': bound})} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels, {'le': '+Inf'})} {histogram['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
+
+def init_app(app):
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        if route != "/metrics":
+            elapsed = time.perf_counter() - start
+            observe("http_request_duration_seconds", elapsed, {"route": route, "method": request.method})
+            inc("http_requests_total", {"route": route, "method": request.method, "status": str(response.status_code)})
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
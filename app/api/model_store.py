@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from preprocess import find_catalog_sources, dataset_sha256, PREPROCESS_VERSION
+from catalog import load_catalog
+from train import train_model, assemble_model, update_neighbors, encode_features_with_columns, FEATURE_COLUMNS, NEIGHBOR_K
+from metrics import record_cache
+from content_model import content_settings, LSH_ARRAYS
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMAT_VERSION = 4
+MODEL_ARRAYS = ["features", "neighbor_ids", "neighbor_scores"]
+MODEL_CACHE_DIR = os.getenv(
+    "MODEL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "models")
+)
+
+def model_fingerprint(dataset_path, rating_fill, k=NEIGHBOR_K, sha256=None):
+    # The missing-rating fill is part of the key: an incrementally updated model keeps its previous fill, so it must not
+    # share a fingerprint with a model trained from scratch on the same data.
+    settings = {
+        "format_version": MODEL_FORMAT_VERSION,
+        "preprocess_version": PREPROCESS_VERSION,
+        "feature_columns": FEATURE_COLUMNS,
+        "neighbor_k": k,
+        "content_model": content_settings(),
+        "rating_fill": rating_fill,
+        "dataset_sha256": sha256 or dataset_sha256(dataset_path)
+    }
+    encoded = json.dumps(settings, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def model_path(fingerprint, cache_dir=MODEL_CACHE_DIR):
+    return os.path.join(cache_dir, f"model-v{MODEL_FORMAT_VERSION}-{fingerprint[:16]}")
+
+def save_model(model, fingerprint, cache_dir=MODEL_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    target = model_path(fingerprint, cache_dir)
+    staging = tempfile.mkdtemp(prefix=".model-", dir=cache_dir)
+
+    arrays = MODEL_ARRAYS + [name for name in LSH_ARRAYS if name in model]
+
+    try:
+        for name in arrays:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(model[name]))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({
+                "format_version": MODEL_FORMAT_VERSION,
+                "fingerprint": fingerprint,
+                "arrays": arrays,
+                "rows": int(len(model["features"])),
+                "rating_fill": model["rating_fill"]
+            }, f)
+
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.isdir(target):
+                raise
+            shutil.rmtree(staging)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return target
+
+def load_model(fingerprint, catalog, cache_dir=MODEL_CACHE_DIR):
+    path = model_path(fingerprint, cache_dir)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != MODEL_FORMAT_VERSION or meta.get("fingerprint") != fingerprint:
+        return None
+    if meta.get("rows") != catalog["size"]:
+        return None
+
+    arrays = {}
+    for name in meta.get("arrays", MODEL_ARRAYS):
+        arrays[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    lsh_index = {name: arrays.pop(name) for name in LSH_ARRAYS if name in arrays}
+    return assemble_model(
+        catalog, arrays["features"], arrays["neighbor_ids"], arrays["neighbor_scores"], lsh_index, meta.get("rating_fill")
+    )
+
+def load_cached_model(fingerprint, catalog, cache_dir=MODEL_CACHE_DIR):
+    try:
+        model = load_model(fingerprint, catalog, cache_dir)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable model cache: %s", e)
+        model = None
+
+    record_cache("model", model is not None)
+    return model
+
+def store_model(model, fingerprint, cache_dir=MODEL_CACHE_DIR):
+    try:
+        save_model(model, fingerprint, cache_dir)
+    except OSError as e:
+        logger.warning("Could not write model cache: %s", e)
+
+def load_or_train_model(dataset_path=None, k=NEIGHBOR_K, cache_dir=MODEL_CACHE_DIR, catalog=None, sha256=None):
+    if dataset_path is None:
+        dataset_path = find_catalog_sources()
+    if catalog is None:
+        catalog = load_catalog(dataset_path)
+
+    fingerprint = model_fingerprint(dataset_path, catalog["rating_fill"], k, sha256)
+    model = load_cached_model(fingerprint, catalog, cache_dir)
+    if model is None:
+        logger.info("Training recommendation model for fingerprint %s...", fingerprint[:16])
+        model = train_model(k, dataset_path, catalog)
+        store_model(model, fingerprint, cache_dir)
+    model["fingerprint"] = fingerprint
+    return model
+
+def incremental_update(previous_model, previous_catalog, catalog):
+    if content_settings()["enabled"] or previous_catalog["size"] != len(previous_model["names"]):
+        return None
+
+    rating_fill = previous_model["rating_fill"]
+    features, columns = encode_features_with_columns(catalog, rating_fill)
+    _, previous_columns = encode_features_with_columns(previous_catalog, rating_fill)
+    if columns != previous_columns:
+        return None
+
+    previous_keys = pd.Index(previous_catalog["exercise_ids"])
+    keys = pd.Index(catalog["exercise_ids"])
+    if not previous_keys.is_unique or not keys.is_unique:
+        return None
+
+    new_to_old = previous_keys.get_indexer(keys)
+    matched = np.flatnonzero(new_to_old >= 0)
+    same = np.all(features[matched] == previous_model["features"][new_to_old[matched]], axis=1)
+    unchanged = matched[same]
+
+    old_to_new = np.full(previous_catalog["size"], -1, dtype=np.int64)
+    old_to_new[new_to_old[unchanged]] = unchanged
+    affected = np.setdiff1d(np.arange(catalog["size"]), unchanged)
+
+    updated = update_neighbors(
+        previous_model["neighbor_ids"], previous_model["neighbor_scores"], features, old_to_new, affected
+    )
+    if updated is None:
+        return None
+
+    neighbor_ids, neighbor_scores, recomputed = updated
+    stats = {
+        "mode": "incremental",
+        "changed_rows": int(len(affected)),
+        "removed_rows": int(previous_catalog["size"] - len(matched)),
+        "recomputed_rows": int(recomputed)
+    }
+    return assemble_model(catalog, features, neighbor_ids, neighbor_scores, rating_fill=rating_fill), stats
+
+def update_or_train_model(previous_model, previous_catalog, catalog, dataset_path, k=NEIGHBOR_K, cache_dir=MODEL_CACHE_DIR,
+                          sha256=None):
+    fingerprint = model_fingerprint(dataset_path, catalog["rating_fill"], k, sha256)
+    model = load_cached_model(fingerprint, catalog, cache_dir)
+    if model is not None:
+        model["fingerprint"] = fingerprint
+        return model, {"mode": "cached"}
+
+    updated = None
+    if previous_model is not None and k == NEIGHBOR_K:
+        incremental_fingerprint = model_fingerprint(dataset_path, previous_model["rating_fill"], k, sha256)
+        if incremental_fingerprint != fingerprint:
+            model = load_cached_model(incremental_fingerprint, catalog, cache_dir)
+            if model is not None:
+                model["fingerprint"] = incremental_fingerprint
+                return model, {"mode": "cached"}
+        updated = incremental_update(previous_model, previous_catalog, catalog)
+
+    if updated is None:
+        logger.info("Retraining recommendation model for fingerprint %s...", fingerprint[:16])
+        model, stats = train_model(k, dataset_path, catalog), {"mode": "full"}
+    else:
+        model, stats = updated
+        fingerprint = incremental_fingerprint
+        logger.info("Incrementally updated recommendation model %s: %s", fingerprint[:16], stats)
+
+    store_model(model, fingerprint, cache_dir)
+    model["fingerprint"] = fingerprint
+    return model, stats
+
+if __name__ == "__main__":
+    dataset_path = find_catalog_sources()
+    model = load_or_train_model(dataset_path)
+    fingerprint = model["fingerprint"]
+    print(f"Model {fingerprint[:16]}: {len(model['names'])} exercises at {model_path(fingerprint)}")
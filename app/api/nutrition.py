@@ -0,0 +1,395 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import stage_timer, record_cache
+from nutrition_db import NUTRITION_DB_PATH, LocalNutritionDB
+
+logger = logging.getLogger(__name__)
+
+USDA_API_KEY = os.getenv("USDA_API_KEY")
+USDA_BASE_URL = os.getenv("USDA_BASE_URL")
+USDA_TIMEOUT = float(os.getenv("USDA_TIMEOUT", 10))
+USDA_POOL_SIZE = int(os.getenv("USDA_POOL_SIZE", 10))
+NUTRITION_CACHE_SIZE = int(os.getenv("NUTRITION_CACHE_SIZE", 2048))
+NUTRITION_CACHE_TTL = float(os.getenv("NUTRITION_CACHE_TTL", 24 * 60 * 60))
+NUTRITION_CACHE_PATH = os.getenv("NUTRITION_CACHE_PATH")
+NUTRITION_BATCH_WORKERS = int(os.getenv("NUTRITION_BATCH_WORKERS", 8))
+USDA_MAX_IDS_PER_REQUEST = 20
+NUTRITION_SOURCE = os.getenv("NUTRITION_SOURCE", "usda").lower()
+NUTRITION_SOURCES = ("usda", "local", "auto")
+
+if NUTRITION_SOURCE not in NUTRITION_SOURCES:
+    raise ValueError(f"NUTRITION_SOURCE must be one of {NUTRITION_SOURCES}")
+
+NUTRIENT_IDS = {
+    "Total Fat": 1004,
+    "Saturated Fat": 1258,
+    "Trans Fat": 1257,
+    "Cholesterol": 1253,
+    "Sodium": 1093,
+    "Total Carbohydrates": 1005,
+    "Dietary Fiber": 1079,
+    "Total Sugars": 2000,
+    "Added Sugars": 1235,
+    "Protein": 1003,
+    "Energy": [1008, 2048, 2047]
+}
+
+# Each USDA nutrient id maps to one label; for labels with several ids, the later ids only fill in when the first is absent.
+NUTRIENT_NAMES = {
+    nutrient_id: name
+    for name, ids in NUTRIENT_IDS.items()
+    for nutrient_id in (ids if isinstance(ids, list) else [ids])
+}
+FALLBACK_NUTRIENT_IDS = {
+    nutrient_id for ids in NUTRIENT_IDS.values() if isinstance(ids, list) for nutrient_id in ids[1:]
+}
+
+class TTLCache:
+    def __init__(self, max_size=NUTRITION_CACHE_SIZE, ttl=NUTRITION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class DiskCache:
+    def __init__(self, path, ttl=NUTRITION_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS nutrition_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, expires FROM nutrition_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, key, value):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO nutrition_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl)
+            )
+            self.connection.commit()
+
+def build_session(pool_size=USDA_POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+session = build_session()
+memory_cache = TTLCache()
+disk_cache = DiskCache(NUTRITION_CACHE_PATH) if NUTRITION_CACHE_PATH else None
+
+_local_db_lock = threading.Lock()
+_local_db = None
+
+def local_db():
+    global _local_db
+    if NUTRITION_SOURCE == "usda":
+        return None
+    with _local_db_lock:
+        if _local_db is None and os.path.exists(NUTRITION_DB_PATH):
+            _local_db = LocalNutritionDB(NUTRITION_DB_PATH)
+            logger.info("Serving nutrition lookups from %s", NUTRITION_DB_PATH)
+    if _local_db is None and NUTRITION_SOURCE == "local":
+        raise ValueError(f"NUTRITION_SOURCE is local but {NUTRITION_DB_PATH} does not exist; run nutrition_db.py import first")
+    return _local_db
+
+_inflight_lock = threading.Lock()
+_inflight = {}
+
+def coalesced(key, fetch):
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = {"done": threading.Event(), "result": None, "error": None}
+            _inflight[key] = call
+
+    if not leader:
+        call["done"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    try:
+        call["result"] = fetch()
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call["done"].set()
+    return call["result"]
+
+def cached_lookup(key, fetch):
+    found, value = memory_cache.get(key)
+    record_cache("nutrition_memory", found)
+    if found:
+        return value
+
+    if disk_cache is not None:
+        found, value = disk_cache.get(key)
+        record_cache("nutrition_disk", found)
+        if found:
+            memory_cache.set(key, value)
+            return value
+
+    value = coalesced(key, fetch)
+    if value is not None:
+        memory_cache.set(key, value)
+        if disk_cache is not None:
+            disk_cache.set(key, value)
+    return value
+
+def search_fdc_id(food_query):
+    url = f"{USDA_BASE_URL}/foods/search?api_key={USDA_API_KEY}"
+    payload = {
+        "query": food_query,
+        "dataType": ["Foundation", "SR Legacy"],
+        "pageSize": 5,
+        "sortBy": "dataType.keyword",
+        "sortOrder": "asc"
+    }
+    headers = {"Content-Type": "application/json"}
+
+    with stage_timer("usda_search"):
+        response = session.post(url, json=payload, headers=headers, timeout=USDA_TIMEOUT)
+
+    if response.status_code == 200:
+        data = response.json()
+        if "foods" in data and data["foods"]:
+            for food in data["foods"]:
+                description = food.get("description", "").lower()
+                if description == food_query.lower():
+                    return food.get("fdcId")
+
+            for food in data["foods"]:
+                if food.get("dataType") == "Foundation":
+                    return food.get("fdcId")
+
+            return data["foods"][0].get("fdcId")
+    else:
+        logger.warning("USDA search for '%s' failed with status %s", food_query, response.status_code)
+
+    return None
+
+def parse_food_item(food_item):
+    nutrients = food_item.get("foodNutrients", [])
+
+    macronutrients = {}
+    for nutrient in nutrients:
+        nutrient_id = nutrient.get("nutrient", {}).get("id")
+        name = NUTRIENT_NAMES.get(nutrient_id)
+        if name is None or (nutrient_id in FALLBACK_NUTRIENT_IDS and name in macronutrients):
+            continue
+        amount = nutrient.get("amount", 0)
+        unit = nutrient.get("nutrient", {}).get("unitName", "")
+        macronutrients[name] = f"{amount} {unit}"
+
+    return {
+        "Food": food_item.get("description", "Unknown"),
+        "Nutrients": macronutrients
+    }
+
+def fetch_nutrition_by_fdc(fdc_id):
+    url = f"{USDA_BASE_URL}/foods?fdcIds={fdc_id}&format=full&api_key={USDA_API_KEY}"
+    with stage_timer("usda_food"):
+        response = session.get(url, timeout=USDA_TIMEOUT)
+
+    if response.status_code == 200:
+        data = response.json()
+        if isinstance(data, list) and len(data) > 0:
+            return parse_food_item(data[0])
+    else:
+        logger.warning("USDA food lookup for %s failed with status %s", fdc_id, response.status_code)
+
+    return None
+
+def fetch_nutrition_by_fdc_ids(fdc_ids):
+    results = {}
+    for start in range(0, len(fdc_ids), USDA_MAX_IDS_PER_REQUEST):
+        chunk = fdc_ids[start:start + USDA_MAX_IDS_PER_REQUEST]
+        ids = ",".join(str(fdc_id) for fdc_id in chunk)
+        url = f"{USDA_BASE_URL}/foods?fdcIds={ids}&format=full&api_key={USDA_API_KEY}"
+        with stage_timer("usda_food_batch"):
+            response = session.get(url, timeout=USDA_TIMEOUT)
+
+        if response.status_code != 200:
+            logger.warning("USDA food lookup for %s failed with status %s", ids, response.status_code)
+            continue
+
+        data = response.json()
+        if isinstance(data, list):
+            for food_item in data:
+                results[food_item.get("fdcId")] = parse_food_item(food_item)
+
+    return results
+
+def local_nutrition_by_fdc_ids(db, fdc_ids):
+    with stage_timer("local_food"):
+        items = db.food_items(fdc_ids)
+    return {fdc_id: parse_food_item(food_item) for fdc_id, food_item in items.items()}
+
+def get_fdc_id(food_query):
+    db = local_db()
+    if db is not None:
+        with stage_timer("local_search"):
+            fdc_id = db.search_fdc_id(food_query)
+        if fdc_id is not None or NUTRITION_SOURCE == "local":
+            return fdc_id
+
+    key = "search:" + food_query.lower().strip()
+    return cached_lookup(key, lambda: search_fdc_id(food_query))
+
+def get_nutrition_by_fdc(fdc_id):
+    db = local_db()
+    if db is not None:
+        value = local_nutrition_by_fdc_ids(db, [fdc_id]).get(fdc_id)
+        if value is not None or NUTRITION_SOURCE == "local":
+            return value
+
+    return cached_lookup(f"food:{fdc_id}", lambda: fetch_nutrition_by_fdc(fdc_id))
+
+def get_nutrition_by_fdc_ids(fdc_ids):
+    results = {}
+    missing = []
+    fdc_ids = list(dict.fromkeys(fdc_ids))
+
+    db = local_db()
+    if db is not None:
+        results = local_nutrition_by_fdc_ids(db, fdc_ids)
+        if NUTRITION_SOURCE == "local":
+            return results
+        fdc_ids = [fdc_id for fdc_id in fdc_ids if fdc_id not in results]
+
+    for fdc_id in fdc_ids:
+        key = f"food:{fdc_id}"
+        found, value = memory_cache.get(key)
+        record_cache("nutrition_memory", found)
+        if not found and disk_cache is not None:
+            found, value = disk_cache.get(key)
+            record_cache("nutrition_disk", found)
+            if found:
+                memory_cache.set(key, value)
+        if found:
+            results[fdc_id] = value
+        else:
+            missing.append(fdc_id)
+
+    if missing:
+        fetched = fetch_nutrition_by_fdc_ids(missing)
+        for fdc_id in missing:
+            value = fetched.get(fdc_id)
+            if value is None:
+                continue
+            memory_cache.set(f"food:{fdc_id}", value)
+            if disk_cache is not None:
+                disk_cache.set(f"food:{fdc_id}", value)
+            results[fdc_id] = value
+
+    return results
+
+def nutrient_amount(value):
+    amount, _, unit = value.partition(" ")
+    try:
+        return float(amount), unit
+    except ValueError:
+        return None, unit
+
+def meal_totals(foods):
+    totals = {}
+    units = {}
+    for food in foods:
+        for name, value in food["Nutrients"].items():
+            amount, unit = nutrient_amount(value)
+            if amount is None or units.setdefault(name, unit) != unit:
+                continue
+            totals[name] = totals.get(name, 0.0) + amount
+
+    return {name: f"{round(amount, 3)} {units[name]}" for name, amount in totals.items()}
+
+def get_nutrition_batch(food_queries, max_workers=NUTRITION_BATCH_WORKERS):
+    items = [{"query": query} for query in food_queries]
+
+    def resolve(item):
+        try:
+            item["fdcId"] = get_fdc_id(item["query"])
+        except requests.RequestException as e:
+            item["error"] = f"Food search failed: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        list(pool.map(resolve, items))
+
+    fdc_ids = [item["fdcId"] for item in items if item.get("fdcId")]
+    try:
+        nutrition = get_nutrition_by_fdc_ids(fdc_ids) if fdc_ids else {}
+        fetch_error = None
+    except requests.RequestException as e:
+        nutrition = {}
+        fetch_error = f"Nutrition lookup failed: {e}"
+
+    found = []
+    for item in items:
+        if "error" in item:
+            item["status"] = "error"
+        elif not item.get("fdcId"):
+            item["status"] = "not_found"
+            item["error"] = "Food item not found"
+        elif item["fdcId"] in nutrition:
+            item["status"] = "ok"
+            item.update(nutrition[item["fdcId"]])
+            found.append(item)
+        else:
+            item["status"] = "error"
+            item["error"] = fetch_error or "Failed to fetch nutrition data"
+
+    return {
+        "items": items,
+        "totals": meal_totals(found),
+        "resolved": len(found),
+        "failed": len(items) - len(found)
+    }
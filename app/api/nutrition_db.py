@@ -0,0 +1,237 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_DB_PATH = os.getenv(
+    "NUTRITION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "nutrition.db")
+)
+NUTRITION_DB_VERSION = 1
+IMPORT_BATCH_ROWS = 10000
+
+# Same data types and ordering as the USDA search in get_fdc_id: Foundation first, then SR Legacy.
+DATA_TYPES = {
+    "foundation_food": "Foundation",
+    "Foundation": "Foundation",
+    "sr_legacy_food": "SR Legacy",
+    "SR Legacy": "SR Legacy"
+}
+DATA_TYPE_RANK = {"Foundation": 0, "SR Legacy": 1}
+JSON_FOOD_KEYS = ["FoundationFoods", "SRLegacyFoods"]
+UNIT_NAMES = {"UG": "µg", "KJ": "kJ", "IU": "IU"}
+
+SCHEMA = [
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE food (fdc_id INTEGER PRIMARY KEY, description TEXT NOT NULL, data_type TEXT NOT NULL, data_type_rank INTEGER NOT NULL)",
+    "CREATE INDEX food_description ON food (description COLLATE NOCASE, data_type_rank)",
+    "CREATE TABLE nutrient (id INTEGER PRIMARY KEY, name TEXT NOT NULL, unit_name TEXT NOT NULL)",
+    "CREATE TABLE food_nutrient (fdc_id INTEGER NOT NULL, nutrient_id INTEGER NOT NULL, amount REAL NOT NULL, "
+    "PRIMARY KEY (fdc_id, nutrient_id)) WITHOUT ROWID",
+    "CREATE VIRTUAL TABLE food_fts USING fts5(description, content='food', content_rowid='fdc_id', tokenize='porter unicode61')"
+]
+
+def unit_name(unit):
+    unit = (unit or "").strip()
+    return UNIT_NAMES.get(unit.upper(), unit.lower())
+
+def batched(rows, size=IMPORT_BATCH_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def read_csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+def import_csv_export(connection, directory, counts):
+    foods = set()
+    for batch in batched(read_csv_rows(os.path.join(directory, "food.csv"))):
+        rows = []
+        for row in batch:
+            data_type = DATA_TYPES.get(row.get("data_type"))
+            if data_type is None or not row.get("description"):
+                continue
+            fdc_id = int(row["fdc_id"])
+            foods.add(fdc_id)
+            rows.append((fdc_id, row["description"], data_type, DATA_TYPE_RANK[data_type]))
+        connection.executemany("INSERT OR REPLACE INTO food VALUES (?, ?, ?, ?)", rows)
+        counts["foods"] += len(rows)
+
+    nutrients = [
+        (int(row["id"]), row["name"], unit_name(row.get("unit_name")))
+        for row in read_csv_rows(os.path.join(directory, "nutrient.csv"))
+    ]
+    connection.executemany("INSERT OR REPLACE INTO nutrient VALUES (?, ?, ?)", nutrients)
+    counts["nutrients"] += len(nutrients)
+
+    # food_nutrient.csv is by far the largest file, so it is streamed and filtered to the foods kept above.
+    for batch in batched(read_csv_rows(os.path.join(directory, "food_nutrient.csv"))):
+        rows = [
+            (int(row["fdc_id"]), int(row["nutrient_id"]), float(row["amount"]))
+            for row in batch
+            if row.get("amount") not in (None, "") and int(row["fdc_id"]) in foods
+        ]
+        connection.executemany("INSERT OR REPLACE INTO food_nutrient VALUES (?, ?, ?)", rows)
+        counts["food_nutrients"] += len(rows)
+
+def import_json_export(connection, path, counts):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    items = []
+    for key in JSON_FOOD_KEYS:
+        items.extend(data.get(key, []))
+    if isinstance(data, list):
+        items.extend(data)
+
+    nutrients = {}
+    for batch in batched(items):
+        foods = []
+        amounts = []
+        for item in batch:
+            data_type = DATA_TYPES.get(item.get("dataType"))
+            if data_type is None or not item.get("description"):
+                continue
+            fdc_id = int(item["fdcId"])
+            foods.append((fdc_id, item["description"], data_type, DATA_TYPE_RANK[data_type]))
+            for entry in item.get("foodNutrients", []):
+                nutrient = entry.get("nutrient") or {}
+                if nutrient.get("id") is None or entry.get("amount") is None:
+                    continue
+                nutrients[nutrient["id"]] = (nutrient["id"], nutrient.get("name", ""), unit_name(nutrient.get("unitName")))
+                amounts.append((fdc_id, nutrient["id"], float(entry["amount"])))
+        connection.executemany("INSERT OR REPLACE INTO food VALUES (?, ?, ?, ?)", foods)
+        connection.executemany("INSERT OR REPLACE INTO food_nutrient VALUES (?, ?, ?)", amounts)
+        counts["foods"] += len(foods)
+        counts["food_nutrients"] += len(amounts)
+
+    connection.executemany("INSERT OR REPLACE INTO nutrient VALUES (?, ?, ?)", list(nutrients.values()))
+    counts["nutrients"] += len(nutrients)
+
+def import_fdc(sources, db_path=NUTRITION_DB_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    staging = db_path + f".{os.getpid()}.tmp"
+    if os.path.exists(staging):
+        os.remove(staging)
+
+    counts = {"foods": 0, "nutrients": 0, "food_nutrients": 0}
+    start = time.perf_counter()
+    connection = sqlite3.connect(staging)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        for statement in SCHEMA:
+            connection.execute(statement)
+
+        for source in sources:
+            if os.path.isdir(source):
+                import_csv_export(connection, source, counts)
+            else:
+                import_json_export(connection, source, counts)
+            logger.info("Imported %s: %s", source, counts)
+
+        connection.execute("INSERT INTO food_fts(food_fts) VALUES ('rebuild')")
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("version", str(NUTRITION_DB_VERSION)),
+            ("sources", json.dumps([os.path.abspath(source) for source in sources])),
+            ("imported_at", str(time.time()))
+        ])
+        connection.commit()
+        connection.execute("VACUUM")
+    except Exception:
+        connection.close()
+        os.remove(staging)
+        raise
+    connection.close()
+
+    os.replace(staging, db_path)
+    counts["seconds"] = round(time.perf_counter() - start, 3)
+    return counts
+
+def fts_query(text, operator):
+    tokens = re.findall(r"\w+", text.lower())
+    return f" {operator} ".join(f'"{token}"' for token in tokens)
+
+class LocalNutritionDB:
+    def __init__(self, path=NUTRITION_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        version = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or int(version[0]) != NUTRITION_DB_VERSION:
+            raise ValueError(f"{path} is not a version {NUTRITION_DB_VERSION} nutrition database")
+
+    def search_fdc_id(self, food_query):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fdc_id FROM food WHERE description = ? COLLATE NOCASE ORDER BY data_type_rank, fdc_id LIMIT 1",
+                (food_query.strip(),)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+
+            # All terms first, then any term, ranked like the USDA search: Foundation before SR Legacy, then relevance.
+            for operator in ("AND", "OR"):
+                query = fts_query(food_query, operator)
+                if not query:
+                    return None
+                row = self.connection.execute(
+                    "SELECT food.fdc_id FROM food_fts JOIN food ON food.fdc_id = food_fts.rowid "
+                    "WHERE food_fts MATCH ? ORDER BY food.data_type_rank, bm25(food_fts), food.fdc_id LIMIT 1",
+                    (query,)
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+        return None
+
+    def food_items(self, fdc_ids):
+        if not fdc_ids:
+            return {}
+        placeholders = ",".join("?" * len(fdc_ids))
+        with self.lock:
+            foods = self.connection.execute(
+                f"SELECT fdc_id, description, data_type FROM food WHERE fdc_id IN ({placeholders})", fdc_ids
+            ).fetchall()
+            nutrients = self.connection.execute(
+                "SELECT food_nutrient.fdc_id, nutrient.id, nutrient.name, nutrient.unit_name, food_nutrient.amount "
+                "FROM food_nutrient JOIN nutrient ON nutrient.id = food_nutrient.nutrient_id "
+                f"WHERE food_nutrient.fdc_id IN ({placeholders}) ORDER BY food_nutrient.fdc_id, nutrient.id",
+                fdc_ids
+            ).fetchall()
+
+        # Shaped like the USDA /foods response so nutrition.parse_food_item handles both sources.
+        items = {
+            fdc_id: {"fdcId": fdc_id, "description": description, "dataType": data_type, "foodNutrients": []}
+            for fdc_id, description, data_type in foods
+        }
+        for fdc_id, nutrient_id, name, unit, amount in nutrients:
+            items[fdc_id]["foodNutrients"].append(
+                {"nutrient": {"id": nutrient_id, "name": name, "unitName": unit}, "amount": amount}
+            )
+        return items
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a USDA FoodData Central export into the local nutrition database.")
+    parser.add_argument("sources", nargs="+", help="CSV export directories or JSON export files")
+    parser.add_argument("--db", default=NUTRITION_DB_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    counts = import_fdc(args.sources, args.db)
+    logger.info("Wrote %s: %s", args.db, counts)
+
+if __name__ == "__main__":
+    main()
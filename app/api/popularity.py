@@ -0,0 +1,46 @@
+import logging
+import numpy as np
+import pandas as pd
+from catalog import normalized_codes
+from facets import EMPTY_ROWS
+
+logger = logging.getLogger(__name__)
+
+FACET_COLUMNS = {"muscle": "muscle_group", "equipment": "Equipment", "level": "Level"}
+
+def build_popularity_index(catalog):
+    # A stable sort returns equal ratings in catalog order every time. The original unstable sort_values() could order
+    # such ties differently, so top-N results may differ from it on ties only.
+    ranked_rows = np.argsort(-catalog["ratings"], kind="stable")
+    codes = {}
+    values = {}
+    for facet, column in FACET_COLUMNS.items():
+        facet_codes, values[facet] = normalized_codes(catalog, column)
+        codes[facet] = facet_codes[ranked_rows]
+    keys = pd.DataFrame(codes)
+
+    ranked = {}
+    for facets in [("muscle",), ("muscle", "equipment"), ("muscle", "level"), ("muscle", "equipment", "level")]:
+        for key_codes, positions in keys.groupby(list(facets), sort=False).indices.items():
+            if not isinstance(key_codes, tuple):
+                key_codes = (key_codes,)
+            key = {facet: values[facet][code] for facet, code in zip(facets, key_codes)}
+            ranked[(key["muscle"], key.get("equipment"), key.get("level"))] = ranked_rows[positions]
+
+    return ranked
+
+def normalize_facet(value):
+    if value is None:
+        return None
+    value = value.lower().strip()
+    return value or None
+
+def lookup_popular(ranked, muscle_group, top_n=5, equipment=None, level=None):
+    muscle_group = muscle_group.lower().strip()
+
+    if (muscle_group, None, None) not in ranked:
+        logger.info("Muscle group '%s' not found in dataset!", muscle_group)
+        return EMPTY_ROWS
+
+    rows = ranked.get((muscle_group, normalize_facet(equipment), normalize_facet(level)), EMPTY_ROWS)
+    return rows[:top_n]
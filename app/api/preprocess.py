@@ -1,7 +1,31 @@
 import pandas as pd
+import hashlib
+import json
+import logging
 import os
+import threading
+from metrics import record_cache
+from ingest import CATEGORY_COLUMNS, ingest_sources
+
+PREPROCESS_VERSION = 4
+DATASET_PATH = os.getenv("DATASET_PATH")
+CATALOG_SOURCES = os.getenv("CATALOG_SOURCES")
+CATALOG_CACHE_DIR = os.getenv(
+    "CATALOG_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "catalog")
+)
+
+logger = logging.getLogger(__name__)
+
+_catalog_lock = threading.Lock()
+_catalog_versions = {}
+
+def find_dataset_path():
+    if DATASET_PATH:
+        if not os.path.exists(DATASET_PATH):
+            raise FileNotFoundError(f"DATASET_PATH does not exist: {DATASET_PATH}")
+        return DATASET_PATH
 
-def load_and_preprocess():
     current_dir = os.path.dirname(os.path.abspath(__file__))
     possible_paths = [
         os.path.join(current_dir, "data", "megaGymDataset.csv"),
@@ -17,19 +41,169 @@ def load_and_preprocess():
     
     if not dataset_path:
         raise FileNotFoundError(f"Could not find megaGymDataset.csv in any of these locations: {possible_paths}")
-    
-    df = pd.read_csv(dataset_path)
-    
-    df.drop(columns=['RatingDesc'], inplace=True, errors='ignore')
-    df.rename(columns={'Title': 'exercise', 'Desc': 'description', 'BodyPart': 'muscle_group'}, inplace=True)
-    df['exercise'] = df['exercise'].str.lower().str.strip()
-    df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce')
-    avg_rating = df['Rating'].mean()
-    df['Rating'] = df['Rating'].fillna(avg_rating)
-    text_columns = ['description', 'Type', 'muscle_group', 'Equipment', 'Level']
-    df[text_columns] = df[text_columns].fillna("Unknown")
-
-    return df
+
+    return dataset_path
+
+def find_catalog_sources():
+    if not CATALOG_SOURCES:
+        return find_dataset_path()
+
+    paths = [path for path in CATALOG_SOURCES.split(os.pathsep) if path]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"CATALOG_SOURCES entries do not exist: {missing}")
+    return paths[0] if len(paths) == 1 else tuple(paths)
+
+def source_paths(dataset_path):
+    if isinstance(dataset_path, str):
+        return [dataset_path]
+    return list(dataset_path)
+
+def dataset_key(dataset_path):
+    return "\n".join(os.path.abspath(path) for path in source_paths(dataset_path))
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def sources_sha256(dataset_path):
+    if isinstance(dataset_path, str):
+        return file_sha256(dataset_path)
+    digest = hashlib.sha256()
+    for path in dataset_path:
+        digest.update(file_sha256(path).encode("utf-8"))
+    return digest.hexdigest()
+
+def read_and_clean(dataset_path):
+    return ingest_sources(source_paths(dataset_path))[0]
+
+def file_signature(dataset_path):
+    signatures = []
+    for path in source_paths(dataset_path):
+        stat = os.stat(path)
+        signatures.append({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+    return signatures[0] if isinstance(dataset_path, str) else signatures
+
+def catalog_cache_paths(dataset_path, cache_dir=CATALOG_CACHE_DIR):
+    key = hashlib.sha256(dataset_key(dataset_path).encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(cache_dir, f"catalog-v{PREPROCESS_VERSION}-{key}")
+    return base + ".pkl", base + ".json"
+
+def read_catalog_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("preprocess_version") != PREPROCESS_VERSION or meta.get("pandas_version") != pd.__version__:
+        return None
+    return meta
+
+def write_catalog_meta(meta_path, meta):
+    staging = meta_path + f".{os.getpid()}.tmp"
+    with open(staging, "w") as f:
+        json.dump(meta, f)
+    os.replace(staging, meta_path)
+
+def dataset_sha256(dataset_path, cache_dir=CATALOG_CACHE_DIR):
+    signature = file_signature(dataset_path)
+    _, meta_path = catalog_cache_paths(dataset_path, cache_dir)
+    meta = read_catalog_meta(meta_path)
+    if meta is not None and meta["signature"] == signature:
+        return meta["sha256"]
+    return sources_sha256(dataset_path)
+
+def load_cached_catalog(dataset_path, signature, cache_dir=CATALOG_CACHE_DIR):
+    data_path, meta_path = catalog_cache_paths(dataset_path, cache_dir)
+    meta = read_catalog_meta(meta_path)
+    sha256 = None
+
+    if meta is not None and meta["signature"] != signature:
+        sha256 = sources_sha256(dataset_path)
+        if sha256 != meta["sha256"]:
+            meta = None
+
+    if meta is not None and os.path.exists(data_path):
+        try:
+            df = pd.read_pickle(data_path)
+            if meta["signature"] != signature:
+                meta["signature"] = signature
+                write_catalog_meta(meta_path, meta)
+            record_cache("catalog_disk", True)
+            return df, meta["sha256"], meta.get("ingest")
+        except Exception as e:
+            logger.warning("Ignoring unreadable catalog cache: %s", e)
+
+    record_cache("catalog_disk", False)
+    # Hashed before reading, so a source rewritten mid-ingest can't leave old rows cached under the new hash.
+    if sha256 is None:
+        sha256 = sources_sha256(dataset_path)
+    df, report = ingest_sources(source_paths(dataset_path))
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = data_path + f".{os.getpid()}.tmp"
+        df.to_pickle(staging)
+        os.replace(staging, data_path)
+        write_catalog_meta(meta_path, {
+            "preprocess_version": PREPROCESS_VERSION,
+            "pandas_version": pd.__version__,
+            "source": [os.path.abspath(path) for path in source_paths(dataset_path)],
+            "signature": signature,
+            "sha256": sha256,
+            "ingest": report
+        })
+    except OSError as e:
+        logger.warning("Could not write catalog cache: %s", e)
+
+    return df, sha256, report
+
+LOAD_ATTEMPTS = 3
+
+def load_versioned(dataset_path=None):
+    if dataset_path is None:
+        dataset_path = find_catalog_sources()
+
+    # The signature is re-checked after the read, so the frame, its sha256 and its signature always describe the same
+    # file contents even when a source is rewritten mid-load.
+    for attempt in range(LOAD_ATTEMPTS):
+        signature = file_signature(dataset_path)
+        df, sha256, report = load_cached_catalog(dataset_path, signature)
+        if file_signature(dataset_path) == signature:
+            break
+        logger.info("Catalog sources changed while loading, retrying (%d/%d)", attempt + 1, LOAD_ATTEMPTS)
+
+    version = {"signature": signature, "sha256": sha256, "ingest": report}
+    # Only the version and ingest report are remembered; the frame itself is handed off to catalog.build_catalog.
+    with _catalog_lock:
+        _catalog_versions[dataset_key(dataset_path)] = version
+    return df, version
+
+def load_and_preprocess(dataset_path=None, use_cache=True):
+    if dataset_path is None:
+        dataset_path = find_catalog_sources()
+    if not use_cache:
+        return read_and_clean(dataset_path)
+    return load_versioned(dataset_path)[0]
+
+def get_catalog_version(dataset_path=None):
+    if dataset_path is None:
+        dataset_path = find_catalog_sources()
+
+    key = dataset_key(dataset_path)
+    loaded = _catalog_versions.get(key)
+    signature = file_signature(dataset_path)
+    if loaded is not None and loaded["signature"] == signature:
+        return loaded["sha256"]
+
+    sha256 = dataset_sha256(dataset_path)
+    if loaded is not None and sha256 == loaded["sha256"]:
+        with _catalog_lock:
+            _catalog_versions[key] = dict(loaded, signature=signature)
+    return sha256
 
 if __name__ == "__main__":
     df = load_and_preprocess()
@@ -0,0 +1,130 @@
+import cProfile
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import g, jsonify, request
+from admin import forbidden, is_admin
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", 25))
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", 100))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+
+# Python 3.12+ allows only one active cProfile at a time, so concurrent requests skip profiling instead of failing.
+_active = threading.Lock()
+_lock = threading.Lock()
+_profiles = OrderedDict()
+
+def profile_reason():
+    requested = request.headers.get("X-Profile", request.args.get("profile", "")).lower() in ("1", "true", "yes")
+    if requested and is_admin():
+        return "requested"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+def format_function(key):
+    filename, line, function = key
+    if filename == "~":
+        return function
+    return f"{filename}:{line}({function})"
+
+def top_functions(stats, sort_index, limit=PROFILE_TOP_N):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][sort_index], reverse=True)[:limit]
+    return [
+        {
+            "function": format_function(key),
+            "calls": calls,
+            "self_seconds": round(self_time, 6),
+            "cumulative_seconds": round(cumulative, 6)
+        }
+        for key, (_, calls, self_time, cumulative, _) in rows
+    ]
+
+def store_profile(record, profiler):
+    if PROFILE_DIR:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{record['id']}.prof"))
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", record["id"], e)
+
+    with _lock:
+        _profiles[record["id"]] = record
+        while len(_profiles) > PROFILE_HISTORY:
+            _profiles.popitem(last=False)
+
+def init_app(app):
+    @app.before_request
+    def start_profile():
+        reason = profile_reason()
+        if reason is None or not _active.acquire(blocking=False):
+            return
+        g.profile = {"profiler": cProfile.Profile(), "reason": reason, "start": time.perf_counter()}
+        g.profile["profiler"].enable()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+
+        profiler = profile["profiler"]
+        profiler.disable()
+        _active.release()
+
+        stats = pstats.Stats(profiler)
+        record = {
+            "id": uuid.uuid4().hex[:16],
+            "reason": profile["reason"],
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else "unmatched",
+            "path": request.full_path.rstrip("?"),
+            "status": response.status_code,
+            "duration_seconds": round(time.perf_counter() - profile["start"], 6),
+            "created_at": time.time(),
+            "top_cumulative": top_functions(stats, 3),
+            "top_self": top_functions(stats, 2)
+        }
+        store_profile(record, profiler)
+        inc("profiles_captured_total", {"route": record["route"], "reason": record["reason"]})
+        logger.info("Profiled %s %s in %.4fs as %s", record["method"], record["path"], record["duration_seconds"], record["id"])
+
+        response.headers["X-Profile-Id"] = record["id"]
+        return response
+
+    @app.teardown_request
+    def abandon_profile(error):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile["profiler"].disable()
+            _active.release()
+
+    @app.route('/admin/profiles', methods=['GET'])
+    def list_profiles():
+        if not is_admin():
+            return forbidden()
+        with _lock:
+            summaries = [
+                {key: record[key] for key in ("id", "reason", "method", "path", "status", "duration_seconds", "created_at")}
+                for record in reversed(_profiles.values())
+            ]
+        return jsonify({"profiles": summaries})
+
+    @app.route('/admin/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        if not is_admin():
+            return forbidden()
+        with _lock:
+            record = _profiles.get(profile_id)
+        if record is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return jsonify(record)
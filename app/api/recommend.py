@@ -1,30 +1,165 @@
-import pandas as pd
-from train import train_model
-from preprocess import load_and_preprocess
+import logging
+import os
+import numpy as np
+from catalog_state import get_snapshot
+from train import top_k_per_row
+from content_model import lsh_candidates
+from search import resolve_name, search
+from popularity import lookup_popular
+from facets import filter_mask
+from catalog import resolve_row
 
-similarity_matrix = train_model()
+logger = logging.getLogger(__name__)
 
-def recommend_exercises(exercise_name, top_n=5):
+RECOMMEND_QUERY_BLOCK = int(os.getenv("RECOMMEND_QUERY_BLOCK", 32))
+
+def warm_up():
+    snapshot = get_snapshot()
+    names = snapshot["model"]["names"]
+    if len(names):
+        recommend_exercises(names[0], snapshot=snapshot)
+        recommend_exercises_batch(names[:1].tolist(), snapshot=snapshot)
+        search_exercises(names[0], snapshot=snapshot)
+
+def resolve_exercise(exercise_name, snapshot=None):
+    snapshot = snapshot or get_snapshot()
     exercise_name = exercise_name.lower().strip()
+    if exercise_name in snapshot["model"]["name_index"]:
+        return exercise_name
+
+    resolved = resolve_name(snapshot["search_index"], exercise_name)
+    if resolved is not None:
+        logger.debug("Resolved exercise '%s' to '%s'", exercise_name, resolved)
+    return resolved
+
+def resolve_exercise_row(exercise_name=None, exercise_id=None, snapshot=None):
+    snapshot = snapshot or get_snapshot()
+    if exercise_id is None:
+        exercise_name = resolve_exercise(exercise_name, snapshot)
+        if exercise_name is None:
+            return None
+    return resolve_row(snapshot["catalog"], exercise_name, exercise_id)
+
+def recommend_exercises(exercise_name, top_n=5, equipment=None, types=None, levels=None, muscles=None,
+                        exercise_id=None, with_ids=False, snapshot=None):
+    snapshot = snapshot or get_snapshot()
+    model = snapshot["model"]
+    allowed = filter_mask(snapshot["facet_index"], muscles, equipment, types, levels)
+    row = resolve_exercise_row(exercise_name, exercise_id, snapshot)
+    if row is None:
+        logger.info("Exercise '%s' not found in dataset!", exercise_name if exercise_id is None else exercise_id)
+        return ([], []) if with_ids else []
+
+    rows = neighbor_rows(model, row, top_n, allowed)
+    names = model["names"][rows].tolist()
+    if with_ids:
+        return names, model["exercise_ids"][rows].tolist()
+    return names
+
+def neighbor_rows(model, row, top_n, allowed=None):
+    name_codes = model["name_codes"]
+    neighbors = model["neighbor_ids"][row]
+    neighbors = neighbors[name_codes[neighbors] != name_codes[row]]
+    if allowed is not None:
+        neighbors = neighbors[allowed[neighbors]]
+
+    # The stored neighbors are the global top-k in score order, so the allowed ones among them are also the
+    # filtered top-k; only when too few survive (a large top_n, duplicate titles, a selective filter) are the
+    # allowed rows scored directly.
+    if len(neighbors) >= top_n:
+        return neighbors[:top_n]
+    if allowed is None:
+        allowed = np.ones(len(name_codes), dtype=bool)
+    return filtered_top_k(model, row, allowed, top_n)
+
+def filtered_top_k(model, row, allowed, top_n):
+    candidates = np.flatnonzero(allowed & (model["name_codes"] != model["name_codes"][row]))
+    features = model["features"]
+    scores = features[candidates] @ features[row]
+    top, _ = top_k_per_row(scores[None, :], top_n)
+    return candidates[top[0]]
+
+def search_exercises(query, limit=10, mode="all", snapshot=None):
+    snapshot = snapshot or get_snapshot()
+    return search(snapshot["search_index"], query, limit, mode)
+
+def get_popular_exercises(muscle_group, top_n=5, equipment=None, level=None, with_ids=False, snapshot=None):
+    snapshot = snapshot or get_snapshot()
+    catalog = snapshot["catalog"]
+    rows = lookup_popular(snapshot["popularity"], muscle_group, top_n, equipment, level)
+    names = catalog["names"][rows].tolist()
+    if with_ids:
+        return names, catalog["exercise_ids"][rows].tolist()
+    return names
+
+def exact_top_k(model, query_rows, excluded, top_n):
+    names = model["names"]
+    name_codes = model["name_codes"]
+    features = model["features"]
+    results = []
+
+    for start in range(0, len(query_rows), RECOMMEND_QUERY_BLOCK):
+        block = query_rows[start:start + RECOMMEND_QUERY_BLOCK]
+        scores = features[block] @ features.T
+        scores[name_codes[None, :] == name_codes[block, None]] = -np.inf
+        if excluded is not None:
+            scores[:, excluded] = -np.inf
+
+        top_rows, top_scores = top_k_per_row(scores, top_n)
+        for neighbors, neighbor_scores in zip(top_rows, top_scores):
+            results.append(names[neighbors[np.isfinite(neighbor_scores)]].tolist())
+
+    return results
+
+def approximate_top_k(model, query_rows, excluded, top_n):
+    names = model["names"]
+    name_codes = model["name_codes"]
+    features = model["features"]
+    results = []
+
+    for row, candidates in zip(query_rows, lsh_candidates(model, features[query_rows])):
+        keep = name_codes[candidates] != name_codes[row]
+        if excluded is not None:
+            keep &= ~excluded[candidates]
+        candidates = candidates[keep]
+
+        if len(candidates) < top_n:
+            results.extend(exact_top_k(model, np.array([row]), excluded, top_n))
+            continue
+
+        scores = features[candidates] @ features[row]
+        top = np.lexsort((candidates, -scores))[:top_n]
+        results.append(names[candidates[top]].tolist())
+
+    return results
+
+def recommend_exercises_batch(exercise_names, top_n=5, exclude_submitted=True, equipment=None, types=None,
+                              levels=None, muscles=None, snapshot=None):
+    snapshot = snapshot or get_snapshot()
+    model = snapshot["model"]
+    normalized = list(dict.fromkeys(name.lower().strip() for name in exercise_names))
+    resolved = {name: resolve_exercise(name, snapshot) for name in normalized}
+    rows = {name: model["name_index"].get(resolved[name]) for name in normalized}
+    found = [name for name in normalized if rows[name] is not None]
+    not_found = [name for name in normalized if rows[name] is None]
+
+    if not found:
+        return {}, not_found
+
+    query_rows = np.array([rows[name] for name in found])
+    excluded = None
+    if exclude_submitted:
+        excluded = np.isin(model["name_codes"], model["name_codes"][query_rows])
+    allowed = filter_mask(snapshot["facet_index"], muscles, equipment, types, levels)
+    if allowed is not None:
+        excluded = ~allowed if excluded is None else excluded | ~allowed
+
+    if "lsh_planes" in model:
+        results = approximate_top_k(model, query_rows, excluded, top_n)
+    else:
+        results = exact_top_k(model, query_rows, excluded, top_n)
 
-    if exercise_name not in similarity_matrix.index:
-        print(f"Exercise '{exercise_name}' not found in dataset!")
-        return []
-    
-    similar_exercises = similarity_matrix[exercise_name].drop(exercise_name).sort_values(ascending=False).head(top_n)
-    
-    return similar_exercises.index.tolist()
-
-def get_popular_exercises(muscle_group, top_n=5):
-    df = load_and_preprocess()
-    muscle_group = muscle_group.lower().strip()
-
-    if muscle_group not in df['muscle_group'].str.lower().values:
-        print(f"Muscle group '{muscle_group}' not found in dataset!")
-        return []
-    
-    popular_exercises = df[df['muscle_group'].str.lower() == muscle_group].sort_values(by="Rating", ascending=False)
-    return popular_exercises['exercise'].head(top_n).tolist()
+    return dict(zip(found, results)), not_found
 
 if __name__ == "__main__":
     test_exercise = "bench press"
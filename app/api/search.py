@@ -0,0 +1,117 @@
+import bisect
+import os
+import numpy as np
+
+NGRAM_SIZE = 3
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", 0.3))
+RESOLVE_MIN_SCORE = float(os.getenv("RESOLVE_MIN_SCORE", 0.6))
+
+def normalize_query(text):
+    return " ".join(str(text).lower().split())
+
+def ngrams(text, n=NGRAM_SIZE):
+    padded = f"  {text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+def build_search_index(names):
+    catalog_names = {}
+    for name in names.tolist():
+        catalog_names.setdefault(normalize_query(name), name)
+    catalog_names.pop("", None)
+    unique_names = sorted(catalog_names)
+
+    postings = {}
+    gram_counts = np.empty(len(unique_names), dtype=np.int32)
+    tokens = []
+    for name_id, name in enumerate(unique_names):
+        grams = ngrams(name)
+        gram_counts[name_id] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(name_id)
+        for token in set(name.split()):
+            tokens.append((token, name_id))
+    tokens.sort()
+
+    return {
+        "names": unique_names,
+        "catalog_names": [catalog_names[name] for name in unique_names],
+        "name_ids": {name: name_id for name_id, name in enumerate(unique_names)},
+        "postings": {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()},
+        "gram_counts": gram_counts,
+        "name_lengths": np.array([len(name) for name in unique_names], dtype=np.int32),
+        "tokens": [token for token, _ in tokens],
+        "token_name_ids": np.array([name_id for _, name_id in tokens], dtype=np.int32)
+    }
+
+def prefix_matches(index, query, limit):
+    # Whole-name and word prefix hits are ranked together by the score search() reports for them, so shorter names come
+    # first. Ties go to whole-name prefixes, then alphabetical order.
+    names = index["names"]
+    start = bisect.bisect_left(names, query)
+    stop = bisect.bisect_left(names, query + "\uffff")
+    tokens = index["tokens"]
+    token_start = bisect.bisect_left(tokens, query)
+    token_stop = bisect.bisect_left(tokens, query + "\uffff")
+
+    matches = np.union1d(np.arange(start, stop), index["token_name_ids"][token_start:token_stop])
+    whole_name = (matches >= start) & (matches < stop)
+    order = np.lexsort((matches, ~whole_name, index["name_lengths"][matches]))
+    return matches[order[:limit]].tolist()
+
+def fuzzy_matches(index, query, limit, min_score=SEARCH_MIN_SCORE):
+    grams = ngrams(query)
+    postings = [index["postings"][gram] for gram in grams if gram in index["postings"]]
+    if not postings:
+        return []
+
+    shared = np.bincount(np.concatenate(postings), minlength=len(index["names"]))
+    candidates = np.flatnonzero(shared)
+    scores = 2.0 * shared[candidates] / (len(grams) + index["gram_counts"][candidates])
+    keep = scores >= min_score
+    candidates, scores = candidates[keep], scores[keep]
+
+    if len(candidates) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        candidates, scores = candidates[top], scores[top]
+    order = np.lexsort((candidates, -scores))
+    return list(zip(candidates[order].tolist(), scores[order].tolist()))
+
+def search(index, query, limit=10, mode="all"):
+    query = normalize_query(query)
+    if not query or limit <= 0:
+        return []
+
+    names = index["names"]
+    catalog_names = index["catalog_names"]
+    results = []
+    seen = set()
+
+    def add(name_id, score, match):
+        if name_id not in seen and len(results) < limit:
+            seen.add(name_id)
+            results.append({"exercise": catalog_names[name_id], "score": round(float(score), 4), "match": match})
+
+    exact = index["name_ids"].get(query)
+    if exact is not None:
+        add(exact, 1.0, "exact")
+
+    if mode in ("all", "prefix"):
+        for name_id in prefix_matches(index, query, limit):
+            add(name_id, len(query) / len(names[name_id]), "prefix")
+
+    if mode in ("all", "fuzzy"):
+        for name_id, score in fuzzy_matches(index, query, limit):
+            add(name_id, score, "fuzzy")
+
+    return results
+
+def resolve_name(index, query, min_score=RESOLVE_MIN_SCORE):
+    query = normalize_query(query)
+    exact = index["name_ids"].get(query)
+    if exact is not None:
+        return index["catalog_names"][exact]
+
+    matches = fuzzy_matches(index, query, 1, min_score)
+    if not matches:
+        return None
+    return index["catalog_names"][matches[0][0]]
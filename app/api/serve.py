@@ -0,0 +1,175 @@
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from werkzeug.serving import make_server
+from api import create_app
+from catalog_state import reload_catalog, CATALOG_WATCH_INTERVAL
+from preprocess import file_signature, find_catalog_sources
+import warmup
+
+logger = logging.getLogger(__name__)
+
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", 5001))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", os.cpu_count() or 1))
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", 128))
+SERVE_PRELOAD = os.getenv("SERVE_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+def bind_socket(host, port, backlog=SERVE_BACKLOG):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock, host, port):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    if warmup.WARMUP_ON_START:
+        warmup.start_warmup()
+
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    logger.info("Worker %d serving on %s:%d", os.getpid(), host, port)
+    server.serve_forever()
+
+def spawn_worker(app, sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            run_worker(app, sock, host, port)
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+    return pid
+
+def preload():
+    # Warm the catalog and model in the master; forked workers share these pages copy-on-write.
+    for thread in warmup.start_warmup():
+        thread.join()
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded subsystems: %s", warmup.subsystem_states())
+
+def watch_sources(interval=CATALOG_WATCH_INTERVAL):
+    # Only the master watches the catalog: a change is reported to the master's SIGHUP handler, which loads and trains
+    # it once and then forks fresh workers, instead of every worker rebuilding a private copy.
+    def run():
+        signature = file_signature(find_catalog_sources())
+        while True:
+            time.sleep(interval)
+            try:
+                current = file_signature(find_catalog_sources())
+            except OSError:
+                logger.exception("Could not stat catalog sources")
+                continue
+            if current != signature:
+                signature = current
+                os.kill(os.getpid(), signal.SIGHUP)
+
+    thread = threading.Thread(target=run, name="catalog-watcher", daemon=True)
+    thread.start()
+    return thread
+
+def serve(workers=SERVE_WORKERS, host=SERVE_HOST, port=SERVE_PORT):
+    app = create_app()
+    # Workers forward POST /admin/reload here so the whole pool moves to the new snapshot together. /metrics and
+    # /admin/profiles stay per worker: each response only covers the worker that happened to answer it.
+    app.config["SERVE_MASTER_PID"] = os.getpid()
+
+    sock = bind_socket(host, port)
+
+    if SERVE_PRELOAD:
+        preload()
+    children = {spawn_worker(app, sock, host, port) for _ in range(workers)}
+    retiring = set()
+    stopping = False
+    reloading = False
+    pending = None
+
+    def refork():
+        # New workers start from the master's current snapshot before the old ones are stopped.
+        old = set(children)
+        children.update(spawn_worker(app, sock, host, port) for _ in range(workers))
+        for pid in old:
+            retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        logger.info("Master %d replaced %d workers", os.getpid(), len(old))
+
+    def reload(signum, frame):
+        # SIGHUP reloads if the sources changed and SIGUSR1 always rebuilds. A signal that arrives mid-reload is
+        # remembered and handled once the current one finishes.
+        nonlocal reloading, pending
+        force = signum == signal.SIGUSR1
+        if reloading:
+            pending = bool(pending) or force
+            return
+        reloading = True
+        try:
+            while not stopping:
+                pending = None
+                reloaded = True
+                if SERVE_PRELOAD:
+                    try:
+                        reloaded = reload_catalog(force)[1]
+                        if reloaded:
+                            preload()
+                    except Exception:
+                        logger.exception("Catalog reload failed")
+                        reloaded = False
+                if reloaded:
+                    refork()
+                if pending is None:
+                    break
+                force = pending
+        finally:
+            reloading = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, reload)
+    signal.signal(signal.SIGUSR1, reload)
+    logger.info("Master %d started %d workers on %s:%d", os.getpid(), workers, host, port)
+
+    if CATALOG_WATCH_INTERVAL > 0:
+        watch_sources(CATALOG_WATCH_INTERVAL)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if pid in retiring:
+            retiring.discard(pid)
+        elif not stopping:
+            logger.warning("Worker %d exited with status %d, restarting", pid, status)
+            children.add(spawn_worker(app, sock, host, port))
+
+    sock.close()
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else SERVE_WORKERS
+    serve(workers)
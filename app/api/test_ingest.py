@@ -0,0 +1,36 @@
+import pandas as pd
+from ingest import CATEGORY_COLUMNS, ingest_sources
+
+def write_csv(path, text):
+    path.write_text(text)
+    return str(path)
+
+def test_ingest_merges_source_missing_optional_columns(tmp_path):
+    full = write_csv(tmp_path / "full.csv", (
+        ",Title,Desc,Type,BodyPart,Equipment,Level,Rating,RatingDesc\n"
+        "0,Bench Press,Press the bar,Strength,Chest,Barbell,Beginner,8.0,Average\n"
+        "1,Squat,Squat down,Strength,Quadriceps,Barbell,Intermediate,,\n"
+        "2,Plank,Hold it,Strength,Abdominals,Body Only,Beginner,oops,\n"
+    ))
+    partial = write_csv(tmp_path / "partial.csv", (
+        "Title,BodyPart,Equipment\n"
+        "Zercher Carry,Abdominals,Barbell\n"
+        "bench press,Chest,Barbell\n"
+    ))
+
+    df, report = ingest_sources([full, partial], chunk_rows=2)
+
+    assert df["exercise"].tolist() == ["bench press", "squat", "plank", "zercher carry"]
+    assert [source["rows_accepted"] for source in report["sources"]] == [3, 1]
+    assert df["source"].astype(str).tolist() == ["full.csv", "full.csv", "full.csv", "partial.csv"]
+    assert report["sources"][0]["invalid_ratings"] == 1
+    assert report["sources"][1]["rejected"] == {"missing_title": 0, "duplicate_title": 1}
+
+    carry = df.iloc[3]
+    assert carry["description"] == "Unknown"
+    assert carry["Type"] == "Unknown"
+    assert carry["Level"] == "Unknown"
+    assert pd.isna(carry["Rating"])
+    assert df["Rating"].isna().tolist() == [False, True, True, True]
+    assert pd.isna(carry["Unnamed: 0"])
+    assert all(isinstance(df[column].dtype, pd.CategoricalDtype) for column in CATEGORY_COLUMNS)
@@ -1,20 +1,157 @@
-from sklearn.metrics.pairwise import cosine_similarity
-import pandas as pd
-from preprocess import load_and_preprocess
+import os
+import numpy as np
+from catalog import load_catalog
+import content_model
 
-def train_model():
-    df = load_and_preprocess()
+FEATURE_COLUMNS = ['Type', 'muscle_group', 'Equipment', 'Level']
+NEIGHBOR_K = int(os.getenv("NEIGHBOR_K", 50))
+NEIGHBOR_BLOCK_SIZE = int(os.getenv("NEIGHBOR_BLOCK_SIZE", 1024))
+NEIGHBOR_BLOCK_ELEMENTS = int(os.getenv("NEIGHBOR_BLOCK_ELEMENTS", 1 << 24))
+INCREMENTAL_MAX_FRACTION = float(os.getenv("INCREMENTAL_MAX_FRACTION", 0.25))
 
-    df_encoded = pd.get_dummies(df[['Type', 'muscle_group', 'Equipment', 'Level']], drop_first=True)
+def encode_features(catalog, rating_fill=None):
+    return encode_features_with_columns(catalog, rating_fill)[0]
 
-    df_encoded['Rating'] = df['Rating']
+def catalog_ratings(catalog, rating_fill=None):
+    # Missing ratings take the catalog mean by default; an incremental update passes the fill its model was trained with
+    # instead, so editing one rated row does not shift the features of every unrated one.
+    if rating_fill is None or rating_fill == catalog["rating_fill"]:
+        return catalog["ratings"]
+    return np.where(catalog["rating_missing"], rating_fill, catalog["ratings"])
 
-    similarity_matrix = cosine_similarity(df_encoded)
+def encode_features_with_columns(catalog, rating_fill=None):
+    # One-hot from the catalog's category codes, dropping each column's first category like get_dummies(drop_first=True).
+    widths = [len(catalog["categories"][column]) - 1 for column in FEATURE_COLUMNS]
+    features = np.zeros((catalog["size"], sum(widths) + 1), dtype=np.float32)
+    columns = []
+    offset = 0
+    for column, width in zip(FEATURE_COLUMNS, widths):
+        codes = catalog["codes"][column].astype(np.int64)
+        rows = np.flatnonzero(codes > 0)
+        features[rows, offset + codes[rows] - 1] = 1.0
+        columns.extend(f"{column}_{category}" for category in catalog["categories"][column][1:])
+        offset += width
+    features[:, -1] = catalog_ratings(catalog, rating_fill)
+    columns.append("Rating")
 
-    similarity_df = pd.DataFrame(similarity_matrix, index=df['exercise'], columns=df['exercise'])
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return features / norms, columns
 
-    return similarity_df
+def top_k_per_row(scores, k):
+    rows, n = scores.shape
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty((rows, 0), dtype=np.int64), np.empty((rows, 0), dtype=scores.dtype)
+
+    # Ties at the k-th score are broken by lowest row id so results are deterministic.
+    threshold = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k]
+    above = scores > threshold
+    ties = scores == threshold
+    remaining = k - above.sum(axis=1, keepdims=True)
+    selected = above | (ties & (np.cumsum(ties, axis=1) <= remaining))
+
+    candidates = np.nonzero(selected)[1].reshape(rows, k)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -candidate_scores), axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+def neighbors_for_rows(features, rows, k, block_size=NEIGHBOR_BLOCK_SIZE):
+    neighbor_ids = np.empty((len(rows), k), dtype=np.int32)
+    neighbor_scores = np.empty((len(rows), k), dtype=np.float32)
+    # Each block holds a dense (block x n) score matrix, so shrink blocks as the catalog grows.
+    block_size = max(1, min(block_size, NEIGHBOR_BLOCK_ELEMENTS // max(1, features.shape[0])))
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        scores = features[block] @ features.T
+        scores[np.arange(len(block)), block] = -np.inf
+        stop = start + len(block)
+        neighbor_ids[start:stop], neighbor_scores[start:stop] = top_k_per_row(scores, k)
+
+    return neighbor_ids, neighbor_scores
+
+def top_k_neighbors(features, k=NEIGHBOR_K, block_size=NEIGHBOR_BLOCK_SIZE):
+    n = features.shape[0]
+    k = max(0, min(k, n - 1))
+    return neighbors_for_rows(features, np.arange(n), k, block_size)
+
+def update_neighbors(old_ids, old_scores, features, old_to_new, affected, max_fraction=INCREMENTAL_MAX_FRACTION):
+    n = features.shape[0]
+    k = old_ids.shape[1]
+    if k != max(0, min(NEIGHBOR_K, n - 1)):
+        return None
+
+    is_affected = np.zeros(n, dtype=bool)
+    is_affected[affected] = True
+    new_to_old = np.full(n, -1, dtype=np.int64)
+    kept_old = np.flatnonzero(old_to_new >= 0)
+    new_to_old[old_to_new[kept_old]] = kept_old
+
+    unchanged = np.flatnonzero(~is_affected)
+    mapped_ids = old_to_new[old_ids[new_to_old[unchanged]]]
+    dirty = (mapped_ids < 0).any(axis=1)
+    recompute = np.union1d(affected, unchanged[dirty])
+    if len(recompute) > max_fraction * n:
+        return None
+
+    neighbor_ids = np.empty((n, k), dtype=np.int32)
+    neighbor_scores = np.empty((n, k), dtype=np.float32)
+    neighbor_ids[recompute], neighbor_scores[recompute] = neighbors_for_rows(features, recompute, k)
+
+    clean = unchanged[~dirty]
+    clean_ids = mapped_ids[~dirty]
+    clean_scores = old_scores[new_to_old[clean]]
+    if len(affected) > 0:
+        block_size = max(1, min(NEIGHBOR_BLOCK_SIZE, NEIGHBOR_BLOCK_ELEMENTS // (len(affected) + k)))
+        for start in range(0, len(clean), block_size):
+            block = slice(start, start + block_size)
+            new_scores = features[clean[block]] @ features[affected].T
+            candidate_ids = np.hstack([clean_ids[block], np.broadcast_to(affected, new_scores.shape)])
+            candidate_scores = np.hstack([clean_scores[block], new_scores])
+            order = np.lexsort((candidate_ids, -candidate_scores), axis=1)[:, :k]
+            clean_ids[block] = np.take_along_axis(candidate_ids, order, axis=1)
+            clean_scores[block] = np.take_along_axis(candidate_scores, order, axis=1)
+
+    neighbor_ids[clean] = clean_ids
+    neighbor_scores[clean] = clean_scores
+    return neighbor_ids, neighbor_scores, len(recompute)
+
+def train_model(k=NEIGHBOR_K, dataset_path=None, catalog=None):
+    if catalog is None:
+        catalog = load_catalog(dataset_path)
+
+    features = encode_features(catalog)
+    lsh_index = {}
+    if content_model.CONTENT_MODEL:
+        text_features = content_model.encode_descriptions(catalog["descriptions"].astype(str))
+        features = content_model.combine_features(features, text_features)
+        if catalog["size"] >= content_model.LSH_MIN_ROWS:
+            lsh_index = content_model.build_lsh_index(features)
+
+    if lsh_index:
+        neighbor_ids, neighbor_scores = content_model.lsh_neighbors(features, lsh_index, k)
+    else:
+        neighbor_ids, neighbor_scores = top_k_neighbors(features, k)
+
+    return assemble_model(catalog, features, neighbor_ids, neighbor_scores, lsh_index)
+
+def assemble_model(catalog, features, neighbor_ids, neighbor_scores, lsh_index=None, rating_fill=None):
+    # Names and their lookups are the catalog's own arrays, shared by reference rather than copied into the model.
+    return {
+        "names": catalog["names"],
+        "name_index": catalog["name_index"],
+        "name_codes": catalog["name_codes"],
+        "exercise_ids": catalog["exercise_ids"],
+        "features": features,
+        "neighbor_ids": neighbor_ids,
+        "neighbor_scores": neighbor_scores,
+        "rating_fill": catalog["rating_fill"] if rating_fill is None else rating_fill,
+        **(lsh_index or {})
+    }
 
 if __name__ == "__main__":
-    similarity_matrix = train_model()
-    print(similarity_matrix.head())
+    model = train_model()
+    print(f"Exercises: {len(model['names'])}, neighbors per exercise: {model['neighbor_ids'].shape[1]}")
+    for row in range(3):
+        print(model['names'][row], model['names'][model['neighbor_ids'][row, :5]].tolist())
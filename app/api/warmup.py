@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+import time
+import recommend
+import full_recommendation
+from catalog_state import current_snapshot
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() in ("1", "true", "yes")
+
+SUBSYSTEMS = {
+    "recommendation": recommend.warm_up,
+    "plans": full_recommendation.warm_up
+}
+
+_lock = threading.Lock()
+_states = {name: {"state": "cold", "error": None, "seconds": None} for name in SUBSYSTEMS}
+_started_at = time.time()
+
+def run_warmup(name):
+    start = time.perf_counter()
+    try:
+        SUBSYSTEMS[name]()
+    except Exception as e:
+        logger.exception("Warm-up of %s failed", name)
+        with _lock:
+            _states[name].update(state="failed", error=str(e), seconds=round(time.perf_counter() - start, 4))
+        return
+
+    with _lock:
+        _states[name].update(state="ready", error=None, seconds=round(time.perf_counter() - start, 4))
+    logger.info("Subsystem %s ready in %.2fs", name, _states[name]["seconds"])
+
+def start_warmup(names=None):
+    threads = []
+    for name in names or SUBSYSTEMS:
+        with _lock:
+            if _states[name]["state"] in ("warming", "ready"):
+                continue
+            _states[name]["state"] = "warming"
+        thread = threading.Thread(target=run_warmup, args=(name,), name=f"warmup-{name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+def subsystem_states():
+    with _lock:
+        return {name: dict(state) for name, state in _states.items()}
+
+def is_ready():
+    with _lock:
+        return all(state["state"] == "ready" for state in _states.values())
+
+def health():
+    snapshot = current_snapshot()
+    return {
+        "uptime_seconds": round(time.time() - _started_at, 3),
+        "catalog_version": snapshot["version"] if snapshot else None,
+        "subsystems": subsystem_states()
+    }